@@ -0,0 +1,136 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from engine import FAST_BLUR_PSNR, FILTER_FUNCTIONS, RenderPipeline
+
+# Headless batch CLI: apply one filter/intensity/contrast/exposure to many images
+# across a process pool, e.g.
+#   python batch.py photos/ "raw/*.tif" -o graded/ --filter Cinematic --intensity 0.5
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+PROGRESS_FILE = ".batch_progress.jsonl"
+
+# One pipeline per worker process so compiled LUTs are reused across images
+_pipeline = None
+
+def collect_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = sorted(os.listdir(pattern))
+            matches = [os.path.join(pattern, name) for name in names]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+        paths.extend(p for p in matches if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS)
+    # Keep first occurrence when patterns overlap
+    return list(dict.fromkeys(paths))
+
+def output_path(src, out_dir, ext):
+    base, src_ext = os.path.splitext(os.path.basename(src))
+    return os.path.join(out_dir, base + (ext or src_ext))
+
+def _init_worker(use_lut, blur_tolerance=None, lut3d=False):
+    global _pipeline
+    # The pool already provides the parallelism, keep OpenCV single-threaded per worker
+    cv2.setNumThreads(1)
+    _pipeline = RenderPipeline(stage_cache_bytes=0, use_lut=use_lut, blur_tolerance=blur_tolerance, lut3d=lut3d)
+
+def _process(job):
+    src, dst, params = job
+    start = time.perf_counter()
+    try:
+        image = cv2.imread(src)
+        if image is None:
+            return src, dst, time.perf_counter() - start, "could not decode"
+        out = _pipeline.render(image, None, *params)
+        if not cv2.imwrite(dst, cv2.cvtColor(out, cv2.COLOR_RGB2BGR)):
+            return src, dst, time.perf_counter() - start, "could not encode"
+    except cv2.error as e:
+        # One bad image is reported like any other failure instead of ending the whole run
+        return src, dst, time.perf_counter() - start, f"OpenCV error: {str(e).strip()}"
+    return src, dst, time.perf_counter() - start, None
+
+def load_progress(path, params):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if entry.get("params") == list(params):
+                done.add(entry["src"])
+    return done
+
+def run(args):
+    params = (args.filter, args.intensity, args.contrast, args.exposure)
+    if args.ext and (not args.ext.startswith(".") or not cv2.haveImageWriter("x" + args.ext)):
+        print(f"Cannot write {args.ext!r} images, give an extension such as .jpg or .png", file=sys.stderr)
+        return 2
+    os.makedirs(args.output, exist_ok=True)
+    progress_path = os.path.join(args.output, PROGRESS_FILE)
+    sources = collect_inputs(args.inputs)
+    done = load_progress(progress_path, params) if args.resume else set()
+    jobs = [(src, output_path(src, args.output, args.ext), params) for src in sources if src not in done]
+    for src, dst, _ in jobs:
+        if os.path.abspath(src) == os.path.abspath(dst):
+            print(f"Refusing to overwrite input {src}, choose another output directory or --ext", file=sys.stderr)
+            return 2
+    print(f"{len(sources)} images, {len(sources) - len(jobs)} already done, {len(jobs)} to process")
+    failures = 0
+    processed = 0
+    start = time.perf_counter()
+    with open(progress_path, "a") as progress, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(not args.exact, args.fast_blur, args.lut3d)
+    ) as pool:
+        if args.unordered:
+            futures = [pool.submit(_process, job) for job in jobs]
+            results = (f.result() for f in as_completed(futures))
+        else:
+            results = pool.map(_process, jobs, chunksize=args.chunksize)
+        for src, dst, seconds, error in results:
+            processed += 1
+            if error:
+                failures += 1
+                print(f"[{processed}/{len(jobs)}] FAILED {src}: {error}", file=sys.stderr)
+                continue
+            progress.write(json.dumps({"src": src, "dst": dst, "params": list(params)}) + "\n")
+            progress.flush()
+            if args.verbose:
+                print(f"[{processed}/{len(jobs)}] {src} -> {dst} ({seconds * 1000:.0f} ms)")
+    elapsed = time.perf_counter() - start
+    rate = (processed - failures) / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {processed - failures} images ({failures} failed) in {elapsed:.2f} s: {rate:.2f} images/sec")
+    return 1 if failures else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Apply an image filter to a directory or glob of images")
+    parser.add_argument("inputs", nargs="+", help="input directories or glob patterns")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("--filter", required=True, choices=sorted(FILTER_FUNCTIONS), help="filter name")
+    parser.add_argument("--intensity", type=float, default=0.5, help="effect intensity, -1.0 to 1.0")
+    parser.add_argument("--contrast", type=float, default=1.0)
+    parser.add_argument("--exposure", type=float, default=1.0)
+    parser.add_argument("--ext", help="output extension such as .jpg (default: keep the input's)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunksize", type=int, default=1, help="images handed to a worker at once (ordered mode)")
+    parser.add_argument("--unordered", action="store_true", help="report results as they finish")
+    parser.add_argument("--resume", action="store_true", help="skip images finished by an earlier run")
+    parser.add_argument("--exact", action="store_true", help="disable the fused colour LUTs")
+    parser.add_argument("--lut3d", action="store_true",
+                        help="render with exposure through an approximate 3D colour LUT (faster, a few levels off)")
+    parser.add_argument("--fast-blur", type=float, nargs="?", const=FAST_BLUR_PSNR, metavar="PSNR",
+                        help=f"approximate large blurs on a downsampled pyramid level, within PSNR dB "
+                             f"of the exact blur (default {FAST_BLUR_PSNR:.0f})")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser
+
+if __name__ == "__main__":
+    sys.exit(run(build_parser().parse_args()))
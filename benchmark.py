@@ -0,0 +1,301 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image
+from engine import (FAST_BLUR_PSNR, FILTERS, FILTER_FUNCTIONS, SPATIAL_FILTERS, BufferPool, RenderPipeline,
+                    apply_contrast, apply_exposure, fit_to_box, psnr, render_batch, render_into)
+from profiler import percentile
+
+# Benchmark and regression suite for every filter and the post-filter stages.
+#   python benchmark.py run -o results.json                  # full matrix
+#   python benchmark.py run --sizes 0.3,2 --repeat 3 -o quick.json
+#   python benchmark.py compare baseline.json results.json  # exit 1 on regressions/drift
+#   python benchmark.py batch --count 1000 --size 80x54       # render_batch vs a per-image loop
+# Spatial filters also get a "fast_blur" stage: the pyramid blur at --blur-tolerance, with
+# its speed-up over the exact filter and its PSNR/SSIM against the exact output.
+
+HASH_KEYS = ("sha256", "sha256_pipeline", "sha256_pooled")
+DEFAULT_SIZES = (0.3, 2.0, 12.0, 50.0)
+DEFAULT_INTENSITIES = (-1.0, -0.5, 0.0, 0.5, 1.0)
+STAGES = ("filter", "contrast", "exposure", "display")
+BENCH_CONTRAST = 1.2
+BENCH_EXPOSURE = 1.3
+CANVAS_W, CANVAS_H = 520, 390
+
+def synthetic_image(megapixels, seed=0):
+    # Deterministic 4:3 RGB test image: smooth colour fields plus fine grain, so blurs,
+    # LUTs and encoders see photo-like data at any size
+    width = int(round(math.sqrt(megapixels * 1e6 * 4 / 3)))
+    height = int(round(width * 3 / 4))
+    rng = np.random.default_rng(seed)
+    fields = rng.integers(0, 256, (9, 12, 3), dtype=np.uint8)
+    image = cv2.resize(fields, (width, height), interpolation=cv2.INTER_CUBIC)
+    grain = np.empty_like(image)
+    cv2.setRNGSeed(seed)
+    cv2.randn(grain, 128, 10)
+    return cv2.addWeighted(image, 1.0, grain, 1.0, -128)
+
+def ssim(a, b):
+    # Mean structural similarity of the luma planes, 11x11 Gaussian window (sigma 1.5)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    x = cv2.cvtColor(a, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    y = cv2.cvtColor(b, cv2.COLOR_RGB2GRAY).astype(np.float64)
+    def blur(z):
+        return cv2.GaussianBlur(z, (11, 11), 1.5)
+    mx, my = blur(x), blur(y)
+    vx, vy, cov = blur(x * x) - mx * mx, blur(y * y) - my * my, blur(x * y) - mx * my
+    ssim_map = (2 * mx * my + c1) * (2 * cov + c2) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(ssim_map.mean())
+
+def stage_functions(filter_type, intensity):
+    func = FILTER_FUNCTIONS[filter_type]
+    return {
+        "filter": lambda image: func(image, intensity, 1.0),
+        "contrast": lambda image: apply_contrast(image, BENCH_CONTRAST),
+        "exposure": lambda image: apply_exposure(image, BENCH_EXPOSURE),
+        # GUI-free part of display_image: fit to the canvas and wrap for Tk
+        "display": lambda image: Image.fromarray(fit_to_box(image, CANVAS_W, CANVAS_H)),
+    }
+
+def measure(func, image, repeat, warmup):
+    for _ in range(warmup):
+        func(image)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(image)
+        samples.append(time.perf_counter() - start)
+    # Separate traced pass so tracemalloc overhead never reaches the timings.
+    # Covers NumPy and OpenCV result buffers, not OpenCV's internal scratch.
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    func(image)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return samples, peak
+
+def stage_stats(samples, peak, megapixels):
+    median = percentile(samples, 50)
+    return {
+        "median_ms": median * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "mp_per_s": megapixels / median if median > 0 else float("inf"),
+        "peak_bytes": peak,
+    }
+
+def digest(image):
+    return hashlib.sha256(np.ascontiguousarray(image).tobytes()).hexdigest()
+
+def bench_case(image, filter_type, intensity, repeat, warmup, blur_tolerance=FAST_BLUR_PSNR):
+    megapixels = image.shape[0] * image.shape[1] / 1e6
+    funcs = stage_functions(filter_type, intensity)
+    stages = {}
+    current = image
+    for stage in STAGES:
+        stages[stage] = stage_stats(*measure(funcs[stage], current, repeat, warmup), megapixels)
+        if stage != "display":
+            current = funcs[stage](current)
+    if filter_type in SPATIAL_FILTERS:
+        func = FILTER_FUNCTIONS[filter_type]
+        def fast(image):
+            return func(image, intensity, 1.0, tolerance=blur_tolerance)
+        fast_out = fast(image)
+        stages["fast_blur"] = stage_stats(*measure(fast, image, repeat, warmup), megapixels)
+        exact_out = func(image, intensity, 1.0)
+        stages["fast_blur"]["speedup"] = stages["filter"]["median_ms"] / stages["fast_blur"]["median_ms"]
+        error = psnr(fast_out, exact_out)
+        stages["fast_blur"]["psnr_db"] = error if math.isfinite(error) else None  # None: identical
+        stages["fast_blur"]["ssim"] = ssim(fast_out, exact_out)
+    # Whole chain through the allocation-free engine; after warm-up it should allocate nothing
+    pool = BufferPool()
+    def pooled(image):
+        return render_into(image, filter_type, intensity, BENCH_CONTRAST, BENCH_EXPOSURE, pool)
+    # Hashed before the next render reuses the pooled result
+    pooled_hash = digest(pooled(image))
+    allocations = pool.allocations
+    stages["pooled"] = stage_stats(*measure(pooled, image, repeat, warmup), megapixels)
+    stages["pooled"]["steady_allocations"] = pool.allocations - allocations
+    stages["pooled"]["pool_bytes"] = pool.nbytes
+    return {
+        "filter": filter_type,
+        "intensity": intensity,
+        "width": image.shape[1],
+        "height": image.shape[0],
+        "megapixels": round(megapixels, 3),
+        # Golden hashes of the full filter -> contrast -> exposure output: the plain function
+        # chain, RenderPipeline.render with its default colour LUTs, and render_into
+        "sha256": digest(current),
+        "sha256_pipeline": digest(RenderPipeline(stage_cache_bytes=0).render(
+            image, None, filter_type, intensity, BENCH_CONTRAST, BENCH_EXPOSURE)),
+        "sha256_pooled": pooled_hash,
+        "stages": stages,
+    }
+
+def run(args):
+    filters = args.filters.split(",") if args.filters else [name for name, _, _ in FILTERS]
+    unknown = [name for name in filters if name not in FILTER_FUNCTIONS]
+    if unknown:
+        print(f"Unknown filters: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    sizes = [float(s) for s in args.sizes.split(",")]
+    intensities = [float(i) for i in args.intensities.split(",")]
+    cases = []
+    for megapixels in sizes:
+        image = synthetic_image(megapixels, args.seed)
+        for filter_type in filters:
+            for intensity in intensities:
+                case = bench_case(image, filter_type, intensity, args.repeat, args.warmup, args.blur_tolerance)
+                cases.append(case)
+                timings = "  ".join(f"{s} {t['median_ms']:8.2f}" for s, t in case["stages"].items())
+                print(f"{megapixels:5.1f} MP  {filter_type:14s} {intensity:+.1f}  {timings}  ms")
+                fast = case["stages"].get("fast_blur")
+                if fast:
+                    error = "exact" if fast["psnr_db"] is None else f"{fast['psnr_db']:.1f} dB"
+                    print(f"{'':24s}fast blur {fast['speedup']:5.2f}x  PSNR {error}  SSIM {fast['ssim']:.4f}")
+        del image
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+            "repeat": args.repeat,
+            "contrast": BENCH_CONTRAST,
+            "exposure": BENCH_EXPOSURE,
+            "seed": args.seed,
+            "blur_tolerance_db": args.blur_tolerance,
+        },
+        "cases": cases,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {len(cases)} cases to {args.output}")
+    return 0
+
+def case_key(case):
+    return case["filter"], case["intensity"], case["width"], case["height"]
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["meta"].get("opencv") != current["meta"].get("opencv"):
+        print(f"Note: OpenCV {baseline['meta'].get('opencv')} -> {current['meta'].get('opencv')}, "
+              "hash drift may come from the library")
+    old_cases = {case_key(c): c for c in baseline["cases"]}
+    regressions = drift = matched = 0
+    for case in current["cases"]:
+        old = old_cases.get(case_key(case))
+        if old is None:
+            continue
+        matched += 1
+        label = f"{case['filter']} {case['intensity']:+.1f} @ {case['width']}x{case['height']}"
+        # Baselines from before a hash was added only compare the hashes they have
+        changed = [key for key in HASH_KEYS if key in old and key in case and old[key] != case[key]]
+        if not args.skip_hashes and changed:
+            drift += 1
+            print(f"DRIFT      {label}: output hash changed ({', '.join(changed)})")
+        for stage in case["stages"]:
+            if stage not in old["stages"]:
+                continue
+            before = old["stages"][stage]["median_ms"]
+            after = case["stages"][stage]["median_ms"]
+            if after > before * (1 + args.threshold) and after - before > args.min_ms:
+                regressions += 1
+                print(f"REGRESSION {label} [{stage}]: {before:.2f} -> {after:.2f} ms ({after / before - 1:+.0%})")
+            elif args.verbose:
+                print(f"ok         {label} [{stage}]: {before:.2f} -> {after:.2f} ms")
+    print(f"{matched} cases compared: {regressions} regressions, {drift} hash drifts")
+    return 1 if regressions or drift else 0
+
+def batch(args):
+    # Thumbnail-sized images: render_batch over the whole stack against pipeline.render per image
+    filters = args.filters.split(",") if args.filters else [name for name, _, _ in FILTERS]
+    width, height = (int(v) for v in args.size.split("x"))
+    source = synthetic_image(max(1.0, 4 * width * height / 1e6), args.seed)
+    rng = np.random.default_rng(args.seed)
+    corners = zip(rng.integers(0, source.shape[0] - height, args.count), rng.integers(0, source.shape[1] - width, args.count))
+    stack = np.stack([source[y:y + height, x:x + width] for y, x in corners])
+    if args.distinct:
+        intensities = rng.choice(np.linspace(-1, 1, args.distinct), args.count)
+    else:
+        intensities = np.full(args.count, args.intensity)
+    pipeline = RenderPipeline(stage_cache_bytes=0, use_lut=not args.exact, lut3d=args.lut3d)
+    results = []
+    for filter_type in filters:
+        def loop(stack):
+            return [pipeline.render(image, None, filter_type, float(i), args.contrast, args.exposure)
+                    for image, i in zip(stack, intensities)]
+        def batched(stack):
+            return render_batch(stack, filter_type, intensities, args.contrast, args.exposure, pipeline=pipeline,
+                                blur_tolerance=args.fast_blur)
+        loop_s = percentile(measure(loop, stack, args.repeat, args.warmup)[0], 50)
+        batch_s = percentile(measure(batched, stack, args.repeat, args.warmup)[0], 50)
+        error = psnr(batched(stack), np.stack(loop(stack)))
+        results.append({"filter": filter_type, "loop_images_per_s": args.count / loop_s,
+                        "batch_images_per_s": args.count / batch_s, "speedup": loop_s / batch_s,
+                        "psnr_db": error if math.isfinite(error) else None})
+        print(f"{filter_type:14s} loop {args.count / loop_s:9.0f} img/s  batch {args.count / batch_s:9.0f} img/s  "
+              f"{loop_s / batch_s:5.2f}x  {'exact' if not math.isfinite(error) else f'{error:.1f} dB'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"count": args.count, "size": args.size, "distinct": args.distinct, "results": results}, f, indent=1)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark every filter and the contrast/exposure/display stages")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmark matrix and write JSON results")
+    run_parser.add_argument("-o", "--output", default="bench_results.json")
+    run_parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="megapixels, comma separated")
+    run_parser.add_argument("--intensities", default=",".join(str(i) for i in DEFAULT_INTENSITIES))
+    run_parser.add_argument("--filters", help="comma separated filter names (default: all)")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage")
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--blur-tolerance", type=float, default=FAST_BLUR_PSNR,
+                            help="minimum PSNR in dB of the fast pyramid blur against the exact one")
+    run_parser.set_defaults(func=run)
+    compare_parser = commands.add_parser("compare", help="fail on latency regressions or golden hash drift")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed median slowdown, 0.10 = 10%%")
+    compare_parser.add_argument("--min-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    compare_parser.add_argument("--skip-hashes", action="store_true", help="only compare timings")
+    compare_parser.add_argument("-v", "--verbose", action="store_true")
+    compare_parser.set_defaults(func=compare)
+    batch_parser = commands.add_parser("batch", help="compare render_batch throughput with a per-image loop")
+    batch_parser.add_argument("--count", type=int, default=1000, help="images per batch")
+    batch_parser.add_argument("--size", default="80x54", help="image size, WIDTHxHEIGHT")
+    batch_parser.add_argument("--filters", help="comma separated filter names (default: all)")
+    batch_parser.add_argument("--intensity", type=float, default=0.5)
+    batch_parser.add_argument("--distinct", type=int, default=0,
+                              help="draw per-image intensities from this many levels instead of one shared value")
+    batch_parser.add_argument("--contrast", type=float, default=BENCH_CONTRAST)
+    batch_parser.add_argument("--exposure", type=float, default=BENCH_EXPOSURE,
+                              help="1.0 skips the LAB exposure pass, which costs the same either way")
+    batch_parser.add_argument("--exact", action="store_true", help="disable the fused colour LUTs")
+    batch_parser.add_argument("--lut3d", action="store_true", help="allow the approximate 3D colour LUT")
+    batch_parser.add_argument("--fast-blur", type=float, nargs="?", const=FAST_BLUR_PSNR, metavar="PSNR",
+                              help="batch spatial filters with the fast pyramid blur at this PSNR tolerance")
+    batch_parser.add_argument("--repeat", type=int, default=5)
+    batch_parser.add_argument("--warmup", type=int, default=1)
+    batch_parser.add_argument("--seed", type=int, default=0)
+    batch_parser.add_argument("-o", "--output", help="also write the results as JSON")
+    batch_parser.set_defaults(func=batch)
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    sys.exit(args.func(args))
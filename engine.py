@@ -0,0 +1,848 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from PIL import Image
+from profiler import Profiler
+
+# GUI-free filter engine shared by the Tk app, the batch CLI and other tools
+
+STAGE_CACHE_BYTES = 512 * 1024 * 1024
+LUT_SIZE = 33
+LUT_CACHE_BYTES = 64 * 1024 * 1024
+REMAP_TAB = 32  # OpenCV's fixed-point interpolation steps per pixel (INTER_TAB_SIZE)
+
+# --- Filter definitions (name, emoji/icon, tooltip) ---
+FILTERS = [
+    ("Modern Sepia", "🟤", "Warm, modern sepia"),
+    ("Cinematic", "🎬", "Cinematic teal & orange"),
+    ("Teal & Orange", "🌅", "Blockbuster color grade"),
+    ("Soft Pastel", "🌸", "Pastel, soft look"),
+    ("Deep Blue", "🌊", "Cool, deep blue tint"),
+    ("Retro Fade", "📼", "Retro faded film"),
+    ("Vibrant Pop", "🌈", "High vibrance & pop"),
+    ("Black & White", "⚫️", "Classic B&W"),
+    ("Dream Glow", "✨", "Soft dreamy glow"),
+    ("Clean Sharpen", "🔪", "Crisp, clean sharpen"),
+    ("Matte Film", "🎞️", "Matte, flat film look"),
+    ("Golden Hour", "🌇", "Warm golden hour tint"),
+    ("Cyberpunk", "🦾", "Vivid magenta/cyan pop"),
+    ("Sunset", "🌅", "Sunset orange/pink"),
+    ("Frosted", "❄️", "Cool, frosted look"),
+    ("Noir", "🎩", "High-contrast noir B&W"),
+]
+
+# Map filter names to functions for concise logic
+# `scale` is the proxy/full-resolution ratio; blur-based filters scale their radius by it.
+# Passing `pool=` (a BufferPool) makes a filter write into pooled buffers instead of allocating.
+# Spatial filters also take `tolerance=`, a PSNR in dB that enables the fast pyramid blur.
+FILTER_FUNCTIONS = {
+    "Modern Sepia": lambda img, inten, scale, **kw: modern_sepia(img, inten, **kw),
+    "Cinematic": lambda img, inten, scale, **kw: cinematic(img, inten, **kw),
+    "Teal & Orange": lambda img, inten, scale, **kw: teal_orange(img, inten, **kw),
+    "Soft Pastel": lambda img, inten, scale, **kw: soft_pastel(img, inten, scale, **kw),
+    "Deep Blue": lambda img, inten, scale, **kw: deep_blue(img, inten, **kw),
+    "Retro Fade": lambda img, inten, scale, **kw: retro_fade(img, inten, **kw),
+    "Vibrant Pop": lambda img, inten, scale, **kw: vibrant_pop(img, inten, **kw),
+    "Black & White": lambda img, inten, scale, **kw: black_white(img, inten, **kw),
+    "Dream Glow": lambda img, inten, scale, **kw: dream_glow(img, inten, scale, **kw),
+    "Clean Sharpen": lambda img, inten, scale, **kw: clean_sharpen(img, inten, scale, **kw),
+    "Matte Film": lambda img, inten, scale, **kw: matte_film(img, inten, **kw),
+    "Golden Hour": lambda img, inten, scale, **kw: golden_hour(img, inten, **kw),
+    "Cyberpunk": lambda img, inten, scale, **kw: cyberpunk(img, inten, **kw),
+    "Sunset": lambda img, inten, scale, **kw: sunset(img, inten, **kw),
+    "Frosted": lambda img, inten, scale, **kw: frosted(img, inten, scale, **kw),
+    "Noir": lambda img, inten, scale, **kw: noir(img, inten, **kw),
+}
+
+# Filters that map each pixel's colour independently of its neighbours
+POINTWISE_FILTERS = {
+    "Modern Sepia", "Cinematic", "Teal & Orange", "Deep Blue", "Retro Fade", "Vibrant Pop",
+    "Black & White", "Matte Film", "Golden Hour", "Cyberpunk", "Sunset", "Noir",
+}
+# Point-wise filters that also treat R, G and B independently
+SEPARABLE_FILTERS = {
+    "Cinematic", "Teal & Orange", "Deep Blue", "Retro Fade", "Matte Film", "Golden Hour", "Cyberpunk", "Sunset",
+}
+# Filters that read neighbouring pixels (blur, median, sharpen kernels)
+SPATIAL_FILTERS = set(FILTER_FUNCTIONS) - POINTWISE_FILTERS
+# Identity 256-entry RGB ramp; a channel-separable step applied to it is its own exact LUT
+RAMP = np.repeat(np.arange(256, dtype=np.uint8)[:, None, None], 3, axis=2)
+SEPIA_KERNEL = np.array([[0.393, 0.769, 0.189],
+                         [0.349, 0.686, 0.168],
+                         [0.272, 0.534, 0.131]])
+MAX_POOL_TABLES = 256
+# Fixed colour sample used to measure compiled LUTs against the reference path
+LUT_PROBE = np.random.default_rng(0).integers(0, 256, (256, 256, 3), dtype=np.uint8)
+# JPEG decoders can scale by 1/2, 1/4 or 1/8 in the DCT domain for a fraction of the full cost
+REDUCED_MODES = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+REDUCED_EXTENSIONS = {".jpg", ".jpeg", ".jpe"}
+# Fast blur mode: a Gaussian computed on a 2^level downsampled copy and upsampled back.
+# The level is the deepest one whose PSNR against the exact blur on BLUR_PROBE stays
+# within the tolerance; the probe has 1/f detail, so real photos come out better.
+FAST_BLUR_PSNR = 40.0
+FAST_BLUR_MIN_SIGMA = 2.0  # below this the resizes cost about as much as the exact blur
+MAX_BLUR_LEVEL = 3
+# render_batch works through the stack in chunks of about this many source bytes, so every
+# pass of a filter over a chunk stays in cache
+BATCH_CHUNK_BYTES = 256 * 1024
+BLUR_PROBE = np.clip(128 + sum(
+    20 * cv2.resize(np.random.default_rng(octave).standard_normal((2 ** octave, 2 ** octave, 3)).astype(np.float32),
+                    (256, 256), interpolation=cv2.INTER_CUBIC)
+    for octave in range(2, 9)), 0, 255).astype(np.uint8)
+
+class LRUCache:
+    # Thread-safe LRU of numpy arrays bounded by their total size in bytes
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._items[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+class ColorLUT:
+    # A point-wise filter + contrast + exposure chain compiled into one colour lookup.
+    # Channel-separable chains become exact per-channel 1D LUTs. Everything else is a
+    # size x size x 256 3D LUT (exact along blue) read with one bilinear cv2.remap over
+    # (red, green), addressed through per-channel 1D shaper LUTs.
+    def __init__(self, reference, separable, size=LUT_SIZE):
+        self.size = size
+        if separable:
+            self.lut1d = np.ascontiguousarray(reference(RAMP))
+            self.lut3d = None
+        else:
+            nodes = np.round(np.linspace(0, 255, size)).astype(np.uint8)
+            r, g, b = np.meshgrid(nodes, nodes, np.arange(256, dtype=np.uint8), indexing="ij")
+            grid = np.stack([r, g, b], axis=-1).reshape(size * size, 256, 3)
+            table = reference(grid).reshape(size, size, 256, 3)
+            # Remap source: row = green node, column = blue * size + red node
+            self.lut1d = None
+            self.lut3d = np.ascontiguousarray(table.transpose(1, 2, 0, 3).reshape(size, 256 * size, 3))
+            # Shapers: grid node and fixed-point remap weight for every 8-bit value
+            values = np.arange(256)
+            index = np.clip(np.searchsorted(nodes, values, side="right") - 1, 0, size - 2)
+            span = nodes[index + 1].astype(np.float32) - nodes[index]
+            frac = np.round((values - nodes[index]) / span * REMAP_TAB).astype(np.int32)
+            index = index + (frac == REMAP_TAB)
+            frac[frac == REMAP_TAB] = 0
+            self.node_lut = index.astype(np.int16)
+            self.blue_lut = (values * size).astype(np.int16)
+            self.frac_x_lut = frac.astype(np.uint16)
+            self.frac_y_lut = (frac * REMAP_TAB).astype(np.uint16)
+        diff = self.apply(LUT_PROBE).astype(np.int16) - reference(LUT_PROBE)
+        self.max_error = int(np.abs(diff).max())
+
+    @property
+    def nbytes(self):
+        table = self.lut1d if self.lut3d is None else self.lut3d
+        return table.nbytes
+
+    def apply(self, image):
+        if self.lut3d is None:
+            return cv2.LUT(image, self.lut1d)
+        r, g, b = cv2.split(image)
+        map_x = cv2.add(cv2.LUT(r, self.node_lut), cv2.LUT(b, self.blue_lut))
+        map_xy = cv2.merge((map_x, cv2.LUT(g, self.node_lut)))
+        map_frac = cv2.add(cv2.LUT(g, self.frac_y_lut), cv2.LUT(r, self.frac_x_lut))
+        return cv2.remap(self.lut3d, map_xy, map_frac, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+class BufferPool:
+    # Reusable output/scratch arrays keyed by (tag, shape, dtype), plus small per-parameter
+    # tables (LUTs, kernels). `allocations` counts arrays the pool had to create, so a
+    # steady-state render that leaves it unchanged allocated no image-sized memory.
+    # Buffers are overwritten by the next render: use one pool per thread and copy
+    # results that must outlive it. `max_bytes` caps the buffers, dropping the least
+    # recently used ones first, for pools that see an open-ended mix of shapes.
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()
+        self._tables = OrderedDict()
+        self.allocations = 0
+        self.requests = 0
+        self.nbytes = 0
+
+    def get(self, tag, shape, dtype=np.uint8):
+        key = (tag, tuple(shape), np.dtype(dtype))
+        self.requests += 1
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            self._buffers.move_to_end(key)
+            return buffer
+        buffer = self._buffers[key] = np.empty(shape, dtype)
+        self.allocations += 1
+        self.nbytes += buffer.nbytes
+        # Evicted arrays stay valid for whoever still holds them, the pool just forgets them
+        while self.max_bytes is not None and self.nbytes > self.max_bytes and len(self._buffers) > 1:
+            _, old = self._buffers.popitem(last=False)
+            self.nbytes -= old.nbytes
+        return buffer
+
+    def table(self, key, build):
+        self.requests += 1
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = build()
+            self.allocations += 1
+            if len(self._tables) > MAX_POOL_TABLES:
+                self._tables.popitem(last=False)
+        return table
+
+    def clear(self):
+        self._buffers.clear()
+        self._tables.clear()
+        self.nbytes = 0
+
+def _buffer(pool, tag, shape, dtype=np.uint8):
+    # Pooled destination, or None to let OpenCV/NumPy allocate as usual
+    return None if pool is None else pool.get(tag, shape, dtype)
+
+def _table(pool, key, build):
+    return build() if pool is None else pool.table(key, build)
+
+def _pooled_lut(image, pool, key, build):
+    # Channel-separable filters collapse into one exact cv2.LUT pass; `build` runs the
+    # plain implementation on RAMP once per parameter set
+    lut = pool.table(key, lambda: np.ascontiguousarray(build(RAMP)))
+    return cv2.LUT(image, lut, dst=pool.get("filter", image.shape))
+
+def _exposure_lut(exposure):
+    lut = RAMP.copy()
+    lut[:, 0, 0] = cv2.convertScaleAbs(RAMP[:, 0, 0], alpha=exposure).ravel()
+    return lut
+
+def apply_contrast(image, contrast, pool=None):
+    if contrast == 1.0:
+        return image
+    return cv2.convertScaleAbs(image, dst=_buffer(pool, "contrast", image.shape), alpha=contrast, beta=0)
+
+def apply_exposure(image, exposure, pool=None):
+    # Scales L in LAB; the per-value L scaling is a LUT so no channel split/merge is needed
+    if exposure == 1.0:
+        return image
+    lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB, dst=_buffer(pool, "lab", image.shape))
+    cv2.LUT(lab, _table(pool, ("exposure", exposure), lambda: _exposure_lut(exposure)), dst=lab)
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2RGB, dst=_buffer(pool, "exposure", image.shape))
+
+def render_into(image, filter_type, intensity, contrast, exposure, pool, scale=1.0, tolerance=None):
+    # Allocation-free counterpart of RenderPipeline.render: every intermediate and the RGB
+    # result live in `pool`, so the result is only valid until the pool's next render.
+    # `tolerance` enables the fast pyramid blur in spatial filters, as blur_tolerance does.
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=pool.get("convert", image.shape))
+    func = FILTER_FUNCTIONS.get(filter_type)
+    options = {"tolerance": tolerance} if tolerance is not None and filter_type in SPATIAL_FILTERS else {}
+    out = func(rgb, intensity, scale, pool=pool, **options) if func else rgb
+    return apply_exposure(apply_contrast(out, contrast, pool), exposure, pool)
+
+def _gaussian_radius(sigma):
+    # OpenCV sizes the kernel from sigma (3 sigma for 8-bit, 4 sigma for float input)
+    return int(np.ceil(4 * sigma)) + 1
+
+def filter_halo(filter_type, intensity, scale=1.0):
+    # Pixels of context a filter reads on each side of an output pixel, 0 for point-wise ones.
+    # Tiles padded by this much reproduce the whole-image result exactly.
+    if intensity == 0 or filter_type not in SPATIAL_FILTERS:
+        return 0
+    amount = abs(intensity)
+    if filter_type == "Soft Pastel":
+        if intensity > 0:
+            return _gaussian_radius(2 * amount * scale)
+        return (max(1, int(round(3 * scale))) | 1) // 2
+    if filter_type == "Dream Glow":
+        return _gaussian_radius((2 + 8 * amount) * scale)
+    if filter_type == "Clean Sharpen":
+        return 1 if intensity > 0 else _gaussian_radius(2 * amount * scale)
+    if filter_type == "Frosted":
+        return _gaussian_radius(2 * amount * scale) if intensity > 0 else 0
+    return 0
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * math.log10(255.0 ** 2 / mse)
+
+def pyramid_blur(image, sigma, level, dst=None):
+    # Gaussian blur of `sigma` computed at 1/2^level size. INTER_AREA already box-averages
+    # over `factor` pixels, so only the remaining variance is blurred at the small size.
+    factor = 2 ** level
+    h, w = image.shape[:2]
+    small = cv2.resize(image, (-(-w // factor), -(-h // factor)), interpolation=cv2.INTER_AREA)
+    rest = math.sqrt(max(sigma ** 2 - (factor ** 2 - 1) / 12, 0)) / factor
+    if rest > 0:
+        small = cv2.GaussianBlur(small, (0, 0), sigmaX=rest)
+    return cv2.resize(small, (w, h), dst=dst, interpolation=cv2.INTER_LINEAR)
+
+_blur_levels = {}
+
+def blur_level(sigma, tolerance):
+    # Deepest pyramid level within `tolerance` dB PSNR of the exact blur, 0 for exact.
+    # Calibrated once per (sigma, tolerance) on BLUR_PROBE.
+    if tolerance is None or sigma < FAST_BLUR_MIN_SIGMA:
+        return 0
+    key = (round(sigma, 3), tolerance)
+    level = _blur_levels.get(key)
+    if level is None:
+        exact = cv2.GaussianBlur(BLUR_PROBE, (0, 0), sigmaX=sigma)
+        level = 0
+        while level < MAX_BLUR_LEVEL and psnr(pyramid_blur(BLUR_PROBE, sigma, level + 1), exact) >= tolerance:
+            level += 1
+        _blur_levels[key] = level
+    return level
+
+def gaussian_blur(image, sigma, dst=None, tolerance=None):
+    # cv2.GaussianBlur, or its pyramid approximation when a PSNR tolerance is given
+    level = blur_level(sigma, tolerance)
+    if level == 0:
+        return cv2.GaussianBlur(image, (0, 0), sigmaX=sigma, dst=dst)
+    return pyramid_blur(image, sigma, level, dst)
+
+def make_proxy(image, max_w, max_h):
+    # Downscale with INTER_AREA to fit max_w x max_h; returns (proxy, scale)
+    h, w = image.shape[:2]
+    scale = min(max_w / w, max_h / h, 1.0)
+    if scale == 1.0:
+        return image, scale
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+def read_preview(path, max_w, max_h):
+    # Cheap first frame: the smallest reduced decode that still covers max_w x max_h.
+    # Returns (image, factor) with image at 1/factor of full size, or (None, 1) when the
+    # format has no cheap reduced decode or the image is small enough to decode whole.
+    if os.path.splitext(path)[1].lower() not in REDUCED_EXTENSIONS:
+        return None, 1
+    try:
+        with Image.open(path) as header:  # parses the header only, no pixel decode
+            w, h = header.size
+    except OSError:
+        return None, 1
+    # OpenCV applies EXIF rotation, so the box has to be covered either way round
+    shrink = min(max(w / max_w, h / max_h), max(h / max_w, w / max_h))
+    for factor, mode in REDUCED_MODES:
+        if factor <= shrink:
+            image = cv2.imread(path, mode)
+            return (image, factor) if image is not None else (None, 1)
+    return None, 1
+
+def fit_to_box(image, box_w, box_h):
+    # Resize to the largest size with the image's aspect ratio that fits box_w x box_h
+    h, w = image.shape[:2]
+    image_aspect = w / h
+    box_aspect = box_w / box_h
+    if image_aspect > box_aspect:
+        new_w = box_w
+        new_h = int(box_w / image_aspect)
+    else:
+        new_h = box_h
+        new_w = int(box_h * image_aspect)
+    if (new_w, new_h) == (w, h):
+        return image
+    # INTER_AREA averages every source pixel when shrinking, bilinear is fine for enlarging
+    interpolation = cv2.INTER_AREA if new_w < w else cv2.INTER_LINEAR
+    return cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+class RenderPipeline:
+    # Stages: convert -> filter -> contrast -> exposure, each memoized on its inputs in a
+    # byte-bounded LRU. Lookups start at the last stage, so work resumes from the first
+    # changed one. Point-wise filters can fuse filter, contrast and exposure into one LUT.
+    def __init__(self, stage_cache_bytes=STAGE_CACHE_BYTES, lut_cache_bytes=LUT_CACHE_BYTES, use_lut=True, profiler=None,
+                 blur_tolerance=None, lut3d=False):
+        self.stage_cache = LRUCache(stage_cache_bytes)
+        self.lut_cache = LRUCache(lut_cache_bytes)
+        self.use_lut = use_lut
+        # The 3D LUT is off by a few levels (see ColorLUT.max_error), so it is opt-in;
+        # the per-channel 1D LUT is exact and always used when `use_lut` is set
+        self.lut3d = lut3d
+        # PSNR in dB for the fast pyramid blur in spatial filters, None blurs exactly
+        self.blur_tolerance = blur_tolerance
+        self.last_lut_error = None
+        # Times each computed stage, cache hits are not recorded
+        self.profiler = profiler or Profiler()
+
+    def stage(self, key, compute):
+        out = self.stage_cache.get(key)
+        if out is None:
+            out = compute()
+            # Cached outputs are shared between renders, never mutate them
+            out.flags.writeable = False
+            self.stage_cache.put(key, out)
+        return out
+
+    def uses_lut(self, image, filter_type, exposure, pixels=None):
+        # `pixels` decides as for an image of that size instead, so a preview can take the
+        # same path as the full-resolution render it stands in for
+        if not self.use_lut or filter_type not in POINTWISE_FILTERS:
+            return False
+        if filter_type in SEPARABLE_FILTERS and exposure == 1.0:
+            return True
+        if pixels is None:
+            pixels = image.shape[0] * image.shape[1]
+        # A 3D LUT only pays off against the LAB exposure round trip, and only once the
+        # image has clearly more pixels than the grid that has to be compiled
+        return self.lut3d and exposure != 1.0 and pixels > 4 * 256 * LUT_SIZE ** 2
+
+    def stage_keys(self, image, source_key, filter_type, intensity, contrast, exposure, fused=None):
+        # Each key embeds its upstream key; identity stages reuse it so they cost nothing.
+        # The last key always identifies the final output.
+        convert_key = ("convert", source_key)
+        if fused is None:
+            fused = self.uses_lut(image, filter_type, exposure)
+        if fused:
+            return convert_key, ("lut", convert_key, filter_type, intensity, contrast, exposure)
+        filter_key = ("filter", convert_key, filter_type, intensity, self._filter_options(filter_type).get("tolerance"))
+        contrast_key = ("contrast", filter_key, contrast) if contrast != 1.0 else filter_key
+        exposure_key = ("exposure", contrast_key, exposure) if exposure != 1.0 else contrast_key
+        return convert_key, filter_key, contrast_key, exposure_key
+
+    def _filter_options(self, filter_type):
+        if self.blur_tolerance is not None and filter_type in SPATIAL_FILTERS:
+            return {"tolerance": self.blur_tolerance}
+        return {}
+
+    def color_lut(self, filter_type, intensity, contrast, exposure):
+        key = (filter_type, intensity, contrast, exposure, LUT_SIZE)
+        lut = self.lut_cache.get(key)
+        if lut is None:
+            func = FILTER_FUNCTIONS[filter_type]
+            def reference(rgb):
+                return apply_exposure(apply_contrast(func(rgb, intensity, 1.0), contrast), exposure)
+            separable = filter_type in SEPARABLE_FILTERS and exposure == 1.0
+            lut = ColorLUT(reference, separable)
+            self.lut_cache.put(key, lut)
+        self.last_lut_error = lut.max_error
+        return lut
+
+    def render(self, image, source_key, filter_type, intensity, contrast, exposure, scale=1.0, fused=None):
+        # `image` is BGR as decoded by OpenCV, the result is RGB. `source_key` must change
+        # whenever the pixels of `image` do; None renders uncached, e.g. for tiles and frames.
+        # `fused` overrides the automatic LUT choice, e.g. so every tile of a large image
+        # takes the same path.
+        keys = self.stage_keys(image, source_key, filter_type, intensity, contrast, exposure, fused)
+        stage = self.stage if source_key is not None else (lambda key, compute: compute())
+        convert_key = keys[0]
+        func = FILTER_FUNCTIONS.get(filter_type)
+        options = self._filter_options(filter_type)
+        # Upstream stages are resolved before a span opens, so every span is exclusive
+        span = self.profiler.span
+
+        def convert():
+            with span("convert"):
+                return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        if len(keys) == 2:
+            def apply_lut():
+                image_rgb = stage(convert_key, convert)
+                with span("lut_compile"):
+                    lut = self.color_lut(filter_type, intensity, contrast, exposure)
+                with span("lut"):
+                    return lut.apply(image_rgb)
+            return stage(keys[1], apply_lut)
+
+        _, filter_key, contrast_key, exposure_key = keys
+
+        def apply_filter():
+            image_rgb = stage(convert_key, convert)
+            if not func:
+                return image_rgb
+            with span("filter"):
+                return func(image_rgb, intensity, scale, **options)
+
+        def apply_contrast_stage():
+            image_rgb = stage(filter_key, apply_filter)
+            with span("contrast"):
+                return apply_contrast(image_rgb, contrast)
+
+        def apply_exposure_stage():
+            image_rgb = stage(contrast_key, apply_contrast_stage)
+            with span("exposure"):
+                return apply_exposure(image_rgb, exposure)
+
+        return stage(exposure_key, apply_exposure_stage)
+
+def render_image(image, filter_type, intensity, contrast=1.0, exposure=1.0, use_lut=True, blur_tolerance=None,
+                 lut3d=False):
+    # One-off uncached render of a BGR image to RGB, e.g. for batch jobs
+    pipeline = RenderPipeline(stage_cache_bytes=0, use_lut=use_lut, blur_tolerance=blur_tolerance, lut3d=lut3d)
+    return pipeline.render(image, None, filter_type, intensity, contrast, exposure)
+
+def render_thumbnails(image, intensity, contrast=1.0, exposure=1.0, scale=1.0, executor=None):
+    # Renders every filter on one small BGR proxy in a single pass, one filter per task when
+    # an executor is given. The shared RGB conversion is read-only, filters never write to it.
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    rgb.flags.writeable = False
+    names = [name for name, _, _ in FILTERS]
+
+    def render(name):
+        out = FILTER_FUNCTIONS[name](rgb, intensity, scale)
+        return apply_exposure(apply_contrast(out, contrast), exposure)
+
+    outs = executor.map(render, names) if executor else map(render, names)
+    return dict(zip(names, outs))
+
+def render_batch(images, filter_type, intensities, contrast=1.0, exposure=1.0, scale=1.0, pipeline=None,
+                 blur_tolerance=None):
+    # Renders N same-size BGR images to an (N, H, W, 3) RGB stack. `images` is an (N, H, W, 3)
+    # uint8 stack or a list of H x W x 3 images, `intensities` one value or one per image.
+    # The stack is rendered a chunk at a time as one tall (k * H) x W image. Table filters
+    # apply every image's own intensity in the same pass; other filters go through the
+    # images sharing an intensity together, and a `pipeline` lends them its colour LUTs.
+    # `blur_tolerance` enables the fast pyramid blur in spatial filters.
+    stack = np.asarray(images)
+    if stack.ndim != 4 or stack.shape[3] != 3 or stack.dtype != np.uint8:
+        raise ValueError("expected an (N, H, W, 3) uint8 stack or a list of same-size H x W x 3 images")
+    n, h, w = stack.shape[:3]
+    intensities = np.broadcast_to(np.asarray(intensities, dtype=np.float64), (n,))
+    chunk = max(1, BATCH_CHUNK_BYTES // (h * w * 3))
+    out = np.empty_like(stack)
+    values, groups = np.unique(intensities, return_inverse=True)
+    tables = _batch_tables(filter_type, values, contrast, pipeline.lut_cache if pipeline is not None else None)
+    if tables is not None:
+        chunk = min(chunk, 256 // tables.shape[2])  # (table * C + c) << 8 has to fit in 16 bits
+        for start in range(0, n, chunk):
+            part = slice(start, start + chunk)
+            rgb = cv2.cvtColor(stack[part].reshape(-1, w, 3), cv2.COLOR_BGR2RGB)
+            rgb = _apply_tables(rgb, h, filter_type, tables, groups[part], contrast)
+            out[part] = apply_exposure(rgb, exposure).reshape(-1, h, w, 3)
+        return out
+    options = {"tolerance": blur_tolerance} if blur_tolerance is not None and filter_type in SPATIAL_FILTERS else {}
+    for index, value in enumerate(values):
+        members = np.flatnonzero(groups == index)
+        # A LUT is compiled per intensity, so whether it pays off depends on the group's size;
+        # uses_lut only reads the shape, a broadcast view stands in for the group
+        group = np.broadcast_to(stack[0, :1, :1], (len(members) * h, w, 3))
+        fused = pipeline is not None and pipeline.uses_lut(group, filter_type, exposure)
+        for start in range(0, len(members), chunk):
+            part = members[start:start + chunk]
+            if part[-1] - part[0] == len(part) - 1:
+                part = slice(part[0], part[-1] + 1)  # a contiguous run is sliced, not gathered
+            rgb = cv2.cvtColor(stack[part].reshape(-1, w, 3), cv2.COLOR_BGR2RGB)
+            if fused:
+                rgb = pipeline.color_lut(filter_type, float(value), contrast, exposure).apply(rgb)
+            else:
+                rgb = _filter_rows(rgb, h, filter_type, float(value), scale, options)
+                rgb = apply_exposure(apply_contrast(rgb, contrast), exposure)
+            out[part] = rgb.reshape(-1, h, w, 3)
+    return out
+
+def _batch_tables(filter_type, values, contrast, cache=None):
+    # (K, 256, C) tables, one per intensity, for filters whose intensity only enters through
+    # a 256-entry table: per RGB channel, on luma, or on HSV saturation. None otherwise.
+    # Contrast is folded in where it acts on the same values. `cache` is an LRUCache.
+    func = FILTER_FUNCTIONS.get(filter_type)
+    if filter_type in SEPARABLE_FILTERS:
+        def build(v):
+            return apply_contrast(func(RAMP, v, 1.0), contrast)[:, 0]
+    elif filter_type in ("Black & White", "Noir"):
+        # A grey ramp has itself as luma, so the filter run on RAMP is its table on luma
+        def build(v):
+            return apply_contrast(func(RAMP, v, 1.0), contrast)[:, 0, :1]
+    elif filter_type == "Vibrant Pop":
+        def build(v):
+            return _saturation_lut(v)[:, 0, 1:2]
+    else:
+        return None
+    tables = []
+    for v in values:
+        key = ("batch", filter_type, float(v), contrast)
+        table = cache.get(key) if cache is not None else None
+        if table is None:
+            table = build(float(v))
+            if cache is not None:
+                cache.put(key, table)
+        tables.append(table)
+    return np.stack(tables)
+
+def _apply_tables(rgb, h, filter_type, tables, groups, contrast):
+    # Every image in `rgb` (stacked rows of height `h`) through its own table
+    local, index = np.unique(groups, return_inverse=True)
+    rows = np.repeat(index, h)
+    if filter_type in SEPARABLE_FILTERS:
+        return _lookup(rgb, tables[local], rows)
+    if filter_type == "Vibrant Pop":
+        hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+        hsv[..., 1:2] = _lookup(hsv[..., 1:2], tables[local], rows)
+        return apply_contrast(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB), contrast)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    return cv2.cvtColor(_lookup(gray[..., None], tables[local], rows)[..., 0], cv2.COLOR_GRAY2RGB)
+
+def _lookup(planes, tables, rows):
+    # planes[y, x, c] through tables[rows[y], :, c] with one single-channel 16-bit cv2.LUT,
+    # indexed by ((table * C + c) << 8) + value
+    channels = tables.shape[2]
+    lut = np.empty(65536, np.uint8)
+    lut[:tables.size] = tables.transpose(0, 2, 1).ravel()
+    flat = planes.reshape(len(rows), -1)
+    # Two adds along whole rows; broadcasting over the short channel axis is far slower
+    channel = np.tile(np.arange(channels, dtype=np.uint16) << 8, flat.shape[1] // channels)
+    index = np.add(flat, channel, dtype=np.uint16)
+    index += (rows.astype(np.uint16) * channels << 8)[:, None]
+    return cv2.LUT(index, lut).reshape(planes.shape)
+
+def _filter_rows(rgb, h, filter_type, intensity, scale, options):
+    # `rgb` is images of height `h` stacked vertically. Point-wise filters take them in one
+    # call. Spatial ones run per image: each needs its own borders, and padding every image
+    # to keep them apart costs more than the calls it saves.
+    func = FILTER_FUNCTIONS.get(filter_type)
+    if func is None:
+        return rgb
+    if filter_type not in SPATIAL_FILTERS:
+        return func(rgb, intensity, 1.0)
+    out = np.empty_like(rgb)
+    for y in range(0, rgb.shape[0], h):
+        out[y:y + h] = func(rgb[y:y + h], intensity, scale, **options)
+    return out
+
+def modern_sepia(image, intensity, pool=None):
+    # Warm sepia, negative reverses to cool
+    if pool is not None and intensity < 0:
+        return _pooled_lut(image, pool, ("Modern Sepia", intensity), lambda ramp: modern_sepia(ramp, intensity))
+    sepia = cv2.transform(image, SEPIA_KERNEL, dst=_buffer(pool, "sepia", image.shape))
+    if intensity >= 0:
+        out = cv2.addWeighted(image, 1-abs(intensity), sepia, abs(intensity), 0, dst=_buffer(pool, "filter", image.shape))
+    else:
+        # Reverse: cool blue tone
+        blue = image.copy()
+        blue[...,0] = np.clip(blue[...,0]+60*abs(intensity), 0, 255)
+        out = cv2.addWeighted(image, 1-abs(intensity), blue, abs(intensity), 0)
+    return out
+
+def cinematic(image, intensity, pool=None):
+    # Teal & orange, with contrast
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Cinematic", intensity), lambda ramp: cinematic(ramp, intensity))
+    if intensity == 0:
+        return image
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] = np.clip(img[...,0] + 30*intensity, 0, 255)  # Blue
+        img[...,2] = np.clip(img[...,2] + 30*intensity, 0, 255)  # Red
+    else:
+        img[...,1] = np.clip(img[...,1] + 30*(-intensity), 0, 255)  # Green
+    img = cv2.convertScaleAbs(img, alpha=1+0.2*abs(intensity), beta=0)
+    return img
+
+def teal_orange(image, intensity, pool=None):
+    # Blockbuster look
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Teal & Orange", intensity), lambda ramp: teal_orange(ramp, intensity))
+    if intensity == 0:
+        return image
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] = np.clip(img[...,0] + 40*intensity, 0, 255)
+        img[...,2] = np.clip(img[...,2] + 40*intensity, 0, 255)
+    else:
+        img[...,1] = np.clip(img[...,1] + 40*(-intensity), 0, 255)
+    img = cv2.convertScaleAbs(img, alpha=1+0.15*abs(intensity), beta=0)
+    return img
+
+def soft_pastel(image, intensity, scale=1.0, pool=None, tolerance=None):
+    # Pastel: brighten, reduce contrast, add blur
+    if intensity == 0:
+        return image
+    img = cv2.convertScaleAbs(image, dst=_buffer(pool, "pastel", image.shape),
+                              alpha=1-0.3*abs(intensity), beta=30*abs(intensity))
+    if intensity > 0:
+        img = gaussian_blur(img, 2*intensity*scale, _buffer(pool, "filter", image.shape), tolerance)
+    else:
+        # A 3px median shrinks below one pixel on small proxies
+        ksize = max(1, int(round(3*scale))) | 1
+        if ksize > 1:
+            img = cv2.medianBlur(img, ksize, dst=_buffer(pool, "filter", image.shape))
+    return img
+
+def deep_blue(image, intensity, pool=None):
+    # Deep blue/cool
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Deep Blue", intensity), lambda ramp: deep_blue(ramp, intensity))
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] = np.clip(img[...,0] + 60*intensity, 0, 255)
+    else:
+        img[...,2] = np.clip(img[...,2] + 60*(-intensity), 0, 255)
+    return img.astype(np.uint8)
+
+def retro_fade(image, intensity, pool=None):
+    # Faded retro: lower contrast, add magenta/green
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Retro Fade", intensity), lambda ramp: retro_fade(ramp, intensity))
+    img = cv2.convertScaleAbs(image, alpha=1-0.4*abs(intensity), beta=20*abs(intensity))
+    if intensity > 0:
+        img[...,0] = np.clip(img[...,0] + 20*intensity, 0, 255)
+        img[...,2] = np.clip(img[...,2] + 20*intensity, 0, 255)
+    else:
+        img[...,1] = np.clip(img[...,1] + 30*(-intensity), 0, 255)
+    return img
+
+def _scale_saturation(saturation, intensity):
+    # In place on a float32 HSV saturation channel
+    if intensity > 0:
+        saturation[...] = np.clip(saturation*(1+0.8*intensity), 0, 255)
+    else:
+        saturation[...] = np.clip(saturation*(1-0.8*(-intensity)), 0, 255)
+
+def _saturation_lut(intensity):
+    saturation = np.arange(256, dtype=np.float32)
+    _scale_saturation(saturation, intensity)
+    lut = RAMP.copy()
+    lut[:, 0, 1] = saturation.astype(np.uint8)
+    return lut
+
+def vibrant_pop(image, intensity, pool=None):
+    # High vibrance
+    if pool is not None:
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV, dst=pool.get("hsv", image.shape))
+        cv2.LUT(hsv, pool.table(("Vibrant Pop", intensity), lambda: _saturation_lut(intensity)), dst=hsv)
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB, dst=pool.get("filter", image.shape))
+    hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(np.float32)
+    _scale_saturation(hsv[...,1], intensity)
+    img = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB)
+    return img
+
+def black_white(image, intensity, pool=None):
+    # B&W, with fade or contrast
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=_buffer(pool, "gray", image.shape[:2]))
+    if intensity > 0:
+        cv2.convertScaleAbs(gray, dst=gray, alpha=1+0.8*intensity, beta=0)
+    elif intensity < 0:
+        cv2.convertScaleAbs(gray, dst=gray, alpha=1-0.8*(-intensity), beta=30*(-intensity))
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB, dst=_buffer(pool, "filter", image.shape))
+
+def dream_glow(image, intensity, scale=1.0, pool=None, tolerance=None):
+    # Soft dreamy glow
+    if intensity == 0:
+        return image
+    blur = gaussian_blur(image, (2+8*abs(intensity))*scale, _buffer(pool, "blur", image.shape), tolerance)
+    out = _buffer(pool, "filter", image.shape)
+    if intensity > 0:
+        out = cv2.addWeighted(image, 1-0.5*intensity, blur, 0.5*intensity, 0, dst=out)
+    else:
+        out = cv2.addWeighted(image, 1+0.5*intensity, blur, -0.5*intensity, 0, dst=out)
+    return out
+
+def clean_sharpen(image, intensity, scale=1.0, pool=None, tolerance=None):
+    # Sharpen or soften
+    if intensity == 0:
+        return image
+    out = _buffer(pool, "filter", image.shape)
+    if intensity > 0:
+        kernel = _table(pool, ("Clean Sharpen", intensity),
+                        lambda: np.array([[0, -1, 0], [-1, 5+2*intensity, -1], [0, -1, 0]]))
+        out = cv2.filter2D(image, -1, kernel, dst=out)
+    else:
+        out = gaussian_blur(image, 2*(-intensity)*scale, out, tolerance)
+    return out
+
+def matte_film(image, intensity, pool=None):
+    # Matte: flatten contrast, slight fade
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Matte Film", intensity), lambda ramp: matte_film(ramp, intensity))
+    img = cv2.convertScaleAbs(image, alpha=1-0.3*abs(intensity), beta=15*abs(intensity))
+    lut = np.array([min(255, int(255*(i/255)**(1/(1+0.7*abs(intensity))))) for i in range(256)], dtype=np.uint8)
+    img = cv2.LUT(img, lut)
+    return img
+
+def golden_hour(image, intensity, pool=None):
+    # Warm golden tint
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Golden Hour", intensity), lambda ramp: golden_hour(ramp, intensity))
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] -= 30*intensity
+        img[...,1] += 20*intensity
+        img[...,2] += 40*intensity
+    else:
+        img[...,0] += 20*(-intensity)
+        img[...,2] -= 20*(-intensity)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def cyberpunk(image, intensity, pool=None):
+    # Magenta/cyan pop
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Cyberpunk", intensity), lambda ramp: cyberpunk(ramp, intensity))
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] += 40*intensity
+        img[...,2] += 60*intensity
+    else:
+        img[...,1] += 40*(-intensity)
+        img[...,2] -= 40*(-intensity)
+    img = np.clip(img, 0, 255)
+    return img.astype(np.uint8)
+
+def sunset(image, intensity, pool=None):
+    # Orange/pink sunset
+    if pool is not None:
+        return _pooled_lut(image, pool, ("Sunset", intensity), lambda ramp: sunset(ramp, intensity))
+    img = image.astype(np.float32)
+    if intensity > 0:
+        img[...,0] += 20*intensity
+        img[...,1] += 10*intensity
+        img[...,2] += 40*intensity
+    else:
+        img[...,0] -= 20*(-intensity)
+        img[...,2] -= 20*(-intensity)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def frosted(image, intensity, scale=1.0, pool=None, tolerance=None):
+    # Cool, frosted look
+    if pool is not None and intensity <= 0:
+        # Without the blur every channel is shifted independently
+        return _pooled_lut(image, pool, ("Frosted", intensity), lambda ramp: frosted(ramp, intensity))
+    if pool is None:
+        img = image.astype(np.float32)
+    else:
+        img = pool.get("frosted", image.shape, np.float32)
+        np.copyto(img, image)
+    if intensity > 0:
+        img[...,0] += 40*intensity
+        img[...,1] += 20*intensity
+        img = gaussian_blur(img, 2*intensity*scale, _buffer(pool, "frosted_blur", image.shape, np.float32), tolerance)
+    else:
+        img[...,2] += 40*(-intensity)
+        img[...,1] -= 20*(-intensity)
+    np.clip(img, 0, 255, out=img)
+    if pool is None:
+        return img.astype(np.uint8)
+    out = pool.get("filter", image.shape)
+    np.copyto(out, img, casting="unsafe")  # truncates like astype
+    return out
+
+def noir(image, intensity, pool=None):
+    # High-contrast B&W
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY, dst=_buffer(pool, "gray", image.shape[:2]))
+    if intensity > 0:
+        cv2.convertScaleAbs(gray, dst=gray, alpha=1+2*intensity, beta=-40*intensity)
+    elif intensity < 0:
+        cv2.convertScaleAbs(gray, dst=gray, alpha=1-1.5*(-intensity), beta=40*(-intensity))
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB, dst=_buffer(pool, "filter", image.shape))
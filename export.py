@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+import cv2
+from engine import make_proxy
+
+# Export of one rendered image to one or more files with per-format encoder settings.
+# Targets are resized and encoded in parallel on an executor (OpenCV encoders release
+# the GIL), so a full-res TIFF, a web JPEG and a thumbnail cost about the slowest of them.
+
+# libtiff compression codes, spelled out because older OpenCV builds lack the constants
+TIFF_COMPRESSION = {"none": 1, "lzw": 5, "deflate": 8, "packbits": 32773}
+DEFAULT_OPTIONS = {
+    "jpeg_quality": 95,      # 0-100, OpenCV's default
+    "png_compression": 1,    # zlib level 0-9, OpenCV's default
+    "tiff_compression": "lzw",
+    "webp_quality": 90,      # 1-100, above 100 is lossless
+}
+
+class ExportTarget:
+    # One output file of an export job; `max_size` caps the longer side, None keeps full size
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+
+def encode_params(ext, options=None):
+    opts = dict(DEFAULT_OPTIONS, **(options or {}))
+    ext = ext.lower()
+    if ext in (".jpg", ".jpeg", ".jpe"):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(opts["jpeg_quality"])]
+    if ext == ".png":
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(opts["png_compression"])]
+    if ext in (".tif", ".tiff"):
+        return [cv2.IMWRITE_TIFF_COMPRESSION, TIFF_COMPRESSION[opts["tiff_compression"]]]
+    if ext == ".webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(opts["webp_quality"])]
+    return []
+
+def export_image(image_rgb, targets, options=None, executor=None, progress=None):
+    # Writes `image_rgb` to every target. `progress(done, total)` is called from the
+    # worker threads after each file. Returns one dict of sizes and timings per target.
+    bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    lock = threading.Lock()
+    done = [0]
+
+    def run(target):
+        start = time.perf_counter()
+        image = bgr
+        if target.max_size:
+            image = make_proxy(bgr, target.max_size, target.max_size)[0]
+        resized = time.perf_counter()
+        ext = os.path.splitext(target.path)[1]
+        ok, data = cv2.imencode(ext, image, encode_params(ext, options))
+        if not ok:
+            raise ValueError(f"could not encode {target.path}")
+        encoded = time.perf_counter()
+        with open(target.path, "wb") as f:
+            f.write(data)
+        written = time.perf_counter()
+        with lock:
+            done[0] += 1
+            if progress:
+                progress(done[0], len(targets))
+        return {
+            "path": target.path,
+            "width": image.shape[1],
+            "height": image.shape[0],
+            "bytes": len(data),
+            "resize_s": resized - start,
+            "encode_s": encoded - resized,
+            "write_s": written - encoded,
+        }
+
+    return list(executor.map(run, targets) if executor else map(run, targets))
@@ -1,9 +1,22 @@
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import math
 import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, ImageTk
 import customtkinter as ctk
+from engine import FAST_BLUR_PSNR, FILTERS, BufferPool, LRUCache, RenderPipeline, filter_halo, fit_to_box, make_proxy, read_preview, render_image, render_thumbnails
+from profiler import Profiler
+from export import DEFAULT_OPTIONS, TIFF_COMPRESSION, ExportTarget, export_image
+from session import SESSION_CACHE_BYTES, FolderSession
+from tiling import render_box
+from video import VIDEO_EXTENSIONS, VideoSource, open_sink, open_source, process_video
 
 # --- Styling constants ---
 BG_COLOR = "#23272e"
@@ -17,46 +30,21 @@ TOOLTIP_FONT = ("Segoe UI", 11)
 CANVAS_W, CANVAS_H = 520, 390
 FRAME_PAD = 24
 CARD_RADIUS = 20
-
-# --- Filter definitions (name, emoji/icon, tooltip) ---
-FILTERS = [
-    ("Modern Sepia", "🟤", "Warm, modern sepia"),
-    ("Cinematic", "🎬", "Cinematic teal & orange"),
-    ("Teal & Orange", "🌅", "Blockbuster color grade"),
-    ("Soft Pastel", "🌸", "Pastel, soft look"),
-    ("Deep Blue", "🌊", "Cool, deep blue tint"),
-    ("Retro Fade", "📼", "Retro faded film"),
-    ("Vibrant Pop", "🌈", "High vibrance & pop"),
-    ("Black & White", "⚫️", "Classic B&W"),
-    ("Dream Glow", "✨", "Soft dreamy glow"),
-    ("Clean Sharpen", "🔪", "Crisp, clean sharpen"),
-    ("Matte Film", "🎞️", "Matte, flat film look"),
-    ("Golden Hour", "🌇", "Warm golden hour tint"),
-    ("Cyberpunk", "🦾", "Vivid magenta/cyan pop"),
-    ("Sunset", "🌅", "Sunset orange/pink"),
-    ("Frosted", "❄️", "Cool, frosted look"),
-    ("Noir", "🎩", "High-contrast noir B&W"),
-]
-
-# Map filter names to functions for concise logic
-FILTER_FUNCTIONS = {
-    "Modern Sepia": lambda self, img, inten: self._modern_sepia(img, inten),
-    "Cinematic": lambda self, img, inten: self._cinematic(img, inten),
-    "Teal & Orange": lambda self, img, inten: self._teal_orange(img, inten),
-    "Soft Pastel": lambda self, img, inten: self._soft_pastel(img, inten),
-    "Deep Blue": lambda self, img, inten: self._deep_blue(img, inten),
-    "Retro Fade": lambda self, img, inten: self._retro_fade(img, inten),
-    "Vibrant Pop": lambda self, img, inten: self._vibrant_pop(img, inten),
-    "Black & White": lambda self, img, inten: self._black_white(img, inten),
-    "Dream Glow": lambda self, img, inten: self._dream_glow(img, inten),
-    "Clean Sharpen": lambda self, img, inten: self._clean_sharpen(img, inten),
-    "Matte Film": lambda self, img, inten: self._matte_film(img, inten),
-    "Golden Hour": lambda self, img, inten: self._golden_hour(img, inten),
-    "Cyberpunk": lambda self, img, inten: self._cyberpunk(img, inten),
-    "Sunset": lambda self, img, inten: self._sunset(img, inten),
-    "Frosted": lambda self, img, inten: self._frosted(img, inten),
-    "Noir": lambda self, img, inten: self._noir(img, inten),
-}
+# Finished frames are presented at most once per display refresh
+DISPLAY_HZ = 60
+FRAME_S = 1.0 / DISPLAY_HZ
+THUMB_W, THUMB_H = 80, 54
+# Thumbnails refresh once a slider has been still this long
+GALLERY_SETTLE_MS = 150
+# Longer side of the optional extra exports written next to the chosen file
+WEB_EXPORT_SIZE = 2048
+THUMB_EXPORT_SIZE = 256
+# Zoom/pan viewport: display pixels per full-resolution pixel, and its rendered-tile cache
+ZOOM_STEP = 1.25
+MAX_ZOOM = 8.0
+VIEW_TILE = 256
+VIEW_CACHE_BYTES = 256 * 1024 * 1024
+VIEW_POOL_BYTES = 32 * 1024 * 1024  # scratch buffers for tile renders, one set per padded tile shape
 
 class Tooltip:
     def __init__(self, widget, text):
@@ -83,6 +71,115 @@ class Tooltip:
             self.tipwindow.destroy()
             self.tipwindow = None
 
+class CanvasView:
+    # Keeps one PhotoImage and one canvas item per canvas and pastes new frames into them.
+    # Both are only recreated when the displayed size changes.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.photo = None
+        self.item = None
+        self.size = None
+        self.presented = deque()
+        self.overlay = None
+        self.overlay_bg = None
+        self.overlay_text = None
+
+    def show(self, rgb):
+        h, w = rgb.shape[:2]
+        img = Image.fromarray(rgb)
+        if (w, h) == self.size:
+            self.photo.paste(img)
+        else:
+            self.photo = ImageTk.PhotoImage(image=img)
+            self.size = (w, h)
+            self.canvas.config(width=w, height=h)
+            if self.item is None:
+                self.item = self.canvas.create_image(w / 2, h / 2, image=self.photo)
+                if self.overlay is not None:
+                    self.canvas.tag_lower(self.item)
+            else:
+                self.canvas.coords(self.item, w / 2, h / 2)
+                self.canvas.itemconfigure(self.item, image=self.photo)
+        self.presented.append(time.perf_counter())
+
+    def set_overlay(self, text):
+        # Text box drawn above the image in the top-left corner, None hides it
+        if text == self.overlay_text:
+            return
+        self.overlay_text = text
+        if self.overlay is None:
+            self.overlay_bg = self.canvas.create_rectangle(0, 0, 0, 0, fill="#000", outline="")
+            self.overlay = self.canvas.create_text(8, 8, anchor="nw", fill="white", font=("Consolas", 10))
+        state = "hidden" if text is None else "normal"
+        self.canvas.itemconfigure(self.overlay, text=text or "", state=state)
+        self.canvas.itemconfigure(self.overlay_bg, state=state)
+        if text is not None:
+            x0, y0, x1, y1 = self.canvas.bbox(self.overlay)
+            self.canvas.coords(self.overlay_bg, x0 - 4, y0 - 4, x1 + 4, y1 + 4)
+            self.canvas.tag_raise(self.overlay_bg)
+            self.canvas.tag_raise(self.overlay)
+
+    def fps(self):
+        # Frames presented during the last second
+        now = time.perf_counter()
+        while self.presented and now - self.presented[0] > 1.0:
+            self.presented.popleft()
+        return len(self.presented)
+
+class RenderWorker:
+    # Background render thread with a single pending slot: a newer job replaces
+    # the waiting one, so only the latest parameter set is ever rendered
+    def __init__(self, render_fn):
+        self.render_fn = render_fn
+        self.submitted = 0
+        self.rendered = 0
+        self.dropped = 0
+        self._pending = None
+        self._result = None
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = job
+            self.submitted += 1
+            self._cond.notify()
+
+    def queue_depth(self):
+        with self._cond:
+            return (self._pending is not None) + self._busy
+
+    def take_result(self):
+        with self._cond:
+            result, self._result = self._result, None
+            return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                job, self._pending = self._pending, None
+                self._busy = True
+            try:
+                out = self.render_fn(job)
+            except Exception:
+                traceback.print_exc()
+                out = None
+            with self._cond:
+                self._busy = False
+                if out is None:
+                    continue
+                if self._result is not None:
+                    # Finished before the UI collected the previous frame
+                    self.dropped += 1
+                self._result = (job, out)
+                self.rendered += 1
+
 class ImageProcessingApp:
     def __init__(self, root):
         self.root = root
@@ -93,11 +190,58 @@ class ImageProcessingApp:
         ctk.set_default_color_theme("dark-blue")
         self.input_image = None
         self.output_image = None
+        # Canvas-sized copy of the input used for interactive previews
+        self.proxy_image = None
+        self.full_pixels = None
+        self.proxy_scale = 1.0
+        # Bumped on every upload so stage cache keys never mix images
+        self.image_gen = 0
+        self.profiler = Profiler()
+        self.pipeline = RenderPipeline(profiler=self.profiler)
+        # Viewport tiles are rendered uncached, the tile cache keeps the results
+        self.view_pipeline = RenderPipeline(stage_cache_bytes=0, profiler=self.profiler)
+        # Shared thumbnail-sized proxy every filter button previews
+        self.thumb_image = None
+        self.thumb_scale = 1.0
+        self.gallery_after = None
+        self.gallery_ms = None
+        # Background full-resolution decode behind a reduced preview: (future, start time)
+        self.pending_load = None
+        self.load_executor = ThreadPoolExecutor(max_workers=1)
+        # (time to first pixel, time to full resolution) of the last upload, in ms
+        self.load_ms = None
+        # Export job: render + encode on a runner thread, targets encoded in parallel
+        self.export_runner = ThreadPoolExecutor(max_workers=1)
+        self.export_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        self.export_future = None
+        self.export_progress = (0, 1)
+        self.status_message = None
+        # Loaded video: scrubbing shows one frame as the input, export renders every frame
+        self.video_path = None
+        self.video = None
+        # Replaced sources, released by the scrub worker, which may still be reading them
+        self.retired_videos = deque()
+        # Folder session: next/previous through a directory with cached, prefetched decodes
+        self.session = None
+        # Viewport: None fits the whole image, otherwise both canvases show the same crop
+        self.zoom = None
+        self.view_center = (0.0, 0.0)
+        self.pan_start = None
+        self.view_levels = (None, [])
+        self.tile_cache = LRUCache(VIEW_CACHE_BYTES)
+        self.view_pool = BufferPool(VIEW_POOL_BYTES)
         self.strength = 50
         self.exposure = 1.0
         self.contrast = 1.0
         self.selected_filter = FILTERS[0][0]
         self._build_ui()
+        self.render_worker = RenderWorker(self._render_job)
+        self.gallery_executor = ThreadPoolExecutor(max_workers=min(len(FILTERS), os.cpu_count() or 1))
+        self.gallery_worker = RenderWorker(self._render_gallery)
+        self.video_worker = RenderWorker(self._read_frame)
+        self.view_worker = RenderWorker(self._render_view)
+        self.next_frame = time.perf_counter()
+        self.root.after(0, self._poll_render)
 
     def _build_ui(self):
         self.root.grid_rowconfigure(1, weight=1)
@@ -134,7 +278,22 @@ class ImageProcessingApp:
             frame, width=CANVAS_W, height=CANVAS_H, bg="#181a20", bd=0, highlightthickness=0, relief='ridge'
         )
         self.output_canvas.grid(row=0, column=1, padx=24, pady=16, sticky="nsew")
+        self.views = {self.input_canvas: CanvasView(self.input_canvas), self.output_canvas: CanvasView(self.output_canvas)}
+        for canvas in self.views:
+            self._bind_viewport(canvas)
         ctk.CTkLabel(frame, text="Output Image", font=LABEL_FONT, text_color="white", bg_color=CARD_COLOR).grid(row=1, column=1, pady=(0, 12))
+        # Video scrub bar, only shown while a video is loaded
+        self.scrub_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        self.scrub_frame.grid(row=2, column=0, columnspan=2, padx=24, pady=(0, 16), sticky="ew")
+        self.scrub_frame.grid_columnconfigure(0, weight=1)
+        self.scrub_slider = ctk.CTkSlider(
+            self.scrub_frame, from_=0, to=1, command=self._on_scrub,
+            button_color=ACCENT_COLOR, button_hover_color=BUTTON_ACCENT, progress_color=ACCENT_COLOR, height=18
+        )
+        self.scrub_slider.grid(row=0, column=0, sticky="ew")
+        self.frame_label = ctk.CTkLabel(self.scrub_frame, text="", width=90, font=TOOLTIP_FONT, text_color="white")
+        self.frame_label.grid(row=0, column=1, padx=(12, 0))
+        self.scrub_frame.grid_remove()
 
     def _create_controls_panel(self):
         panel = ctk.CTkFrame(self.root, fg_color=CARD_COLOR, corner_radius=CARD_RADIUS)
@@ -206,7 +365,7 @@ class ImageProcessingApp:
         # Action buttons
         btn_frame = ctk.CTkFrame(panel, fg_color="transparent")
         btn_frame.grid(row=7, column=0, columnspan=2, pady=(18, 0), sticky="ew")
-        btn_frame.grid_columnconfigure((0,1), weight=1)
+        btn_frame.grid_columnconfigure((0,1,2), weight=1)
         self.upload_btn = ctk.CTkButton(
             btn_frame, text="📤 Upload Image", command=self.upload_image, font=BUTTON_FONT, height=48, corner_radius=12,
             fg_color="#333", hover_color="#444", text_color="white", border_width=2, border_color=ACCENT_COLOR
@@ -219,6 +378,114 @@ class ImageProcessingApp:
         )
         self.save_btn.grid(row=0, column=1, padx=8, pady=8, sticky="ew")
         Tooltip(self.save_btn, "Save the processed image")
+        self.render_full_btn = ctk.CTkButton(
+            btn_frame, text="🔍 Render Full", command=self.render_full, font=BUTTON_FONT, height=48, corner_radius=12,
+            fg_color="#333", hover_color="#444", text_color="white", border_width=2, border_color=ACCENT_COLOR
+        )
+        self.render_full_btn.grid(row=0, column=2, padx=8, pady=8, sticky="ew")
+        Tooltip(self.render_full_btn, "Render the output at full resolution")
+        # Folder navigation
+        self.folder_btn = ctk.CTkButton(
+            btn_frame, text="📂 Open Folder", command=self.open_folder, font=BUTTON_FONT, height=40, corner_radius=12,
+            fg_color="#333", hover_color="#444", text_color="white", border_width=2, border_color=ACCENT_COLOR
+        )
+        self.folder_btn.grid(row=1, column=0, padx=8, pady=(0, 8), sticky="ew")
+        Tooltip(self.folder_btn, "Step through every image in a folder (Left/Right arrow keys)")
+        self.prev_btn = ctk.CTkButton(
+            btn_frame, text="◀ Prev", command=lambda: self.step_session(-1), font=BUTTON_FONT, height=40,
+            corner_radius=12, fg_color="#333", hover_color="#444", text_color="white", state="disabled"
+        )
+        self.prev_btn.grid(row=1, column=1, padx=8, pady=(0, 8), sticky="ew")
+        self.next_btn = ctk.CTkButton(
+            btn_frame, text="Next ▶", command=lambda: self.step_session(1), font=BUTTON_FONT, height=40,
+            corner_radius=12, fg_color="#333", hover_color="#444", text_color="white", state="disabled"
+        )
+        self.next_btn.grid(row=1, column=2, padx=8, pady=(0, 8), sticky="ew")
+        self.root.bind("<Left>", lambda event: self.step_session(-1))
+        self.root.bind("<Right>", lambda event: self.step_session(1))
+        render_frame = ctk.CTkFrame(panel, fg_color="transparent")
+        render_frame.grid(row=8, column=0, columnspan=2, padx=8, pady=(8, 0), sticky="ew")
+        self.lut_checkbox = ctk.CTkCheckBox(
+            render_frame, text="3D colour LUT", font=TOOLTIP_FONT, text_color="white", command=self._on_lut_toggle,
+            fg_color=ACCENT_COLOR, hover_color=BUTTON_ACCENT
+        )
+        if self.pipeline.lut3d:
+            self.lut_checkbox.select()
+        self.lut_checkbox.grid(row=0, column=0, sticky="w")
+        Tooltip(self.lut_checkbox, "Render images over about 1 MP through one compiled 3D colour LUT when exposure "
+                                   "is set: faster, but up to ~15 levels off the exact result. The preview and "
+                                   "saved files take the same path")
+        self.fast_blur_checkbox = ctk.CTkCheckBox(
+            render_frame, text="Fast blur", font=TOOLTIP_FONT, text_color="white", command=self._on_fast_blur_toggle,
+            fg_color=ACCENT_COLOR, hover_color=BUTTON_ACCENT
+        )
+        self.fast_blur_checkbox.grid(row=0, column=1, padx=(12, 0), sticky="w")
+        Tooltip(self.fast_blur_checkbox, f"Compute large blurs on a downsampled pyramid level (within {FAST_BLUR_PSNR:.0f} dB PSNR); "
+                                         "the zoomed view stays exact")
+        self._create_export_options(panel)
+        # Render queue statistics
+        self.stats_label = ctk.CTkLabel(panel, text="", font=TOOLTIP_FONT, text_color="#aaa", bg_color=CARD_COLOR, justify="left")
+        self.stats_label.grid(row=10, column=0, columnspan=2, padx=8, pady=(4, 0), sticky="w")
+        # Profiling
+        profile_frame = ctk.CTkFrame(panel, fg_color="transparent")
+        profile_frame.grid(row=11, column=0, columnspan=2, padx=8, pady=(4, 12), sticky="ew")
+        self.profile_checkbox = ctk.CTkCheckBox(
+            profile_frame, text="Profiler overlay", font=TOOLTIP_FONT, text_color="white", command=self._on_profile_toggle,
+            fg_color=ACCENT_COLOR, hover_color=BUTTON_ACCENT
+        )
+        self.profile_checkbox.grid(row=0, column=0, sticky="w")
+        Tooltip(self.profile_checkbox, "Time every render stage and show last / p50 / p95 milliseconds on the output")
+        self.trace_btn = ctk.CTkButton(
+            profile_frame, text="Export Trace", command=self.export_trace, font=TOOLTIP_FONT, height=28, width=110,
+            corner_radius=8, fg_color="#333", hover_color="#444", text_color="white"
+        )
+        self.trace_btn.grid(row=0, column=1, padx=(12, 0))
+        Tooltip(self.trace_btn, "Save the recorded stages as a Chrome trace (open in Perfetto)")
+
+    def _create_export_options(self, panel):
+        frame = ctk.CTkFrame(panel, fg_color="transparent")
+        frame.grid(row=9, column=0, columnspan=2, padx=8, pady=(8, 0), sticky="ew")
+        frame.grid_columnconfigure(1, weight=1)
+        sliders = (
+            ("JPEG quality", 50, 100, DEFAULT_OPTIONS["jpeg_quality"], "Higher keeps more detail, lower gives smaller files"),
+            ("PNG compression", 0, 9, DEFAULT_OPTIONS["png_compression"], "Higher gives smaller files but encodes slower"),
+        )
+        self.export_sliders = []
+        for row, (text, low, high, value, tip) in enumerate(sliders):
+            ctk.CTkLabel(frame, text=text, font=TOOLTIP_FONT, text_color="white").grid(row=row, column=0, sticky="w")
+            value_label = ctk.CTkLabel(frame, text=str(value), width=30, font=TOOLTIP_FONT, text_color="white")
+            value_label.grid(row=row, column=2, padx=(8, 0))
+            slider = ctk.CTkSlider(
+                frame, from_=low, to=high, number_of_steps=high - low,
+                command=lambda v, label=value_label: label.configure(text=str(int(float(v)))),
+                button_color=ACCENT_COLOR, button_hover_color=BUTTON_ACCENT, progress_color=ACCENT_COLOR, height=14
+            )
+            slider.set(value)
+            slider.grid(row=row, column=1, padx=(8, 0), sticky="ew")
+            Tooltip(slider, tip)
+            self.export_sliders.append(slider)
+        ctk.CTkLabel(frame, text="TIFF compression", font=TOOLTIP_FONT, text_color="white").grid(row=2, column=0, sticky="w")
+        self.tiff_menu = ctk.CTkOptionMenu(
+            frame, values=list(TIFF_COMPRESSION), font=TOOLTIP_FONT, height=24,
+            fg_color="#333", button_color="#444", button_hover_color=ACCENT_COLOR
+        )
+        self.tiff_menu.set(DEFAULT_OPTIONS["tiff_compression"])
+        self.tiff_menu.grid(row=2, column=1, columnspan=2, padx=(8, 0), pady=4, sticky="w")
+        self.web_checkbox = ctk.CTkCheckBox(
+            frame, text=f"+ Web JPEG ({WEB_EXPORT_SIZE} px)", font=TOOLTIP_FONT, text_color="white",
+            fg_color=ACCENT_COLOR, hover_color=BUTTON_ACCENT
+        )
+        self.web_checkbox.grid(row=3, column=0, pady=4, sticky="w")
+        self.thumb_checkbox = ctk.CTkCheckBox(
+            frame, text=f"+ Thumbnail ({THUMB_EXPORT_SIZE} px)", font=TOOLTIP_FONT, text_color="white",
+            fg_color=ACCENT_COLOR, hover_color=BUTTON_ACCENT
+        )
+        self.thumb_checkbox.grid(row=3, column=1, columnspan=2, padx=(8, 0), pady=4, sticky="w")
+        Tooltip(self.web_checkbox, "Also save a downscaled JPEG next to the chosen file")
+        Tooltip(self.thumb_checkbox, "Also save a small JPEG thumbnail next to the chosen file")
+        self.export_bar = ctk.CTkProgressBar(frame, progress_color=ACCENT_COLOR, height=8)
+        self.export_bar.set(0)
+        self.export_bar.grid(row=4, column=0, columnspan=3, pady=(4, 0), sticky="ew")
 
     def _select_filter(self, name):
         self.selected_filter = name
@@ -230,263 +497,549 @@ class ImageProcessingApp:
         self.strength = int(float(value))
         self.intensity_value.configure(text=str(self.strength))
         self.apply_filter()
+        self._schedule_gallery()
 
     def _on_contrast_change(self, value):
         self.contrast = float(value)
         self.contrast_value.configure(text=f"{self.contrast:.2f}")
         self.apply_filter()
+        self._schedule_gallery()
 
     def _on_exposure_change(self, value):
         self.exposure = float(value)
         self.exposure_value.configure(text=f"{self.exposure:.2f}")
         self.apply_filter()
+        self._schedule_gallery()
+
+    def _on_lut_toggle(self):
+        self.pipeline.lut3d = self.view_pipeline.lut3d = bool(self.lut_checkbox.get())
+        self.apply_filter()
+
+    def _on_fast_blur_toggle(self):
+        self.pipeline.blur_tolerance = FAST_BLUR_PSNR if self.fast_blur_checkbox.get() else None
+        self.apply_filter()
+
+    def _on_profile_toggle(self):
+        self.profiler.enabled = bool(self.profile_checkbox.get())
+        if self.profiler.enabled:
+            self.profiler.clear()  # each enable starts a new session
+        else:
+            self.views[self.output_canvas].set_overlay(None)
+
+    def export_trace(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")]
+        )
+        if file_path:
+            count = self.profiler.export_chrome_trace(file_path)
+            self.status_message = f"Trace: {count} events -> {os.path.basename(file_path)}"
 
     def upload_image(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff")]
+            filetypes=[
+                ("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff"),
+                ("Video files", " ".join("*" + ext for ext in sorted(VIDEO_EXTENSIONS)))
+            ]
         )
         if file_path:
-            self.input_image = cv2.imread(file_path)
-            input_rgb = cv2.cvtColor(self.input_image, cv2.COLOR_BGR2RGB)
-            self.display_image(input_rgb, self.input_canvas)
-            self.apply_filter()
+            self._close_session()
+        if file_path and os.path.splitext(file_path)[1].lower() in VIDEO_EXTENSIONS:
+            self._open_video(file_path)
+        elif file_path:
+            self._retire_video()
+            self.scrub_frame.grid_remove()
+            start = time.perf_counter()
+            preview, factor = read_preview(file_path, CANVAS_W, CANVAS_H)
+            if preview is None:
+                self.pending_load = None
+                image = cv2.imread(file_path)
+                if image is None:
+                    self.status_message = f"Could not decode {os.path.basename(file_path)}"
+                    return
+                self.input_image = image
+                self._set_source(self.input_image, 1.0)
+                elapsed = (time.perf_counter() - start) * 1000
+                self.load_ms = (elapsed, elapsed)
+                return
+            # Edit on the reduced decode right away, the full one swaps in when ready
+            self.input_image = None
+            self.output_image = None
+            self._set_source(preview, 1.0 / factor)
+            self.load_ms = ((time.perf_counter() - start) * 1000, None)
+            self.pending_load = (self.load_executor.submit(cv2.imread, file_path), start)
+
+    def open_folder(self):
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        try:
+            session = FolderSession(folder, CANVAS_W, CANVAS_H, SESSION_CACHE_BYTES)
+        except ValueError as e:
+            self.status_message = str(e)
+            return
+        self._close_session()
+        self.session = session
+        self._retire_video()
+        self.scrub_frame.grid_remove()
+        self.prev_btn.configure(state="normal")
+        self.next_btn.configure(state="normal")
+        self._show_session_image(lambda: session.get(0))
+
+    def step_session(self, delta):
+        if self.session is not None:
+            self._show_session_image(lambda: self.session.step(delta))
+
+    def _show_session_image(self, fetch):
+        try:
+            entry = fetch()
+        except ValueError as e:
+            self.status_message = str(e)
+            return
+        self.pending_load = None
+        self.load_ms = None
+        self.input_image = entry.image
+        self._set_source(entry.image, 1.0, entry.proxy, entry.proxy_scale)
+
+    def _close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+            self.prev_btn.configure(state="disabled")
+            self.next_btn.configure(state="disabled")
+
+    def _retire_video(self):
+        if self.video is not None:
+            self.retired_videos.append(self.video)
+            self.video_worker.submit((None, None))  # any job releases it, even if this one is replaced
+        self.video_path = self.video = None
+
+    def _open_video(self, path):
+        video = VideoSource(path)
+        self._retire_video()
+        self.video = video
+        self.video_path = path
+        last = max(1, self.video.count - 1)
+        self.scrub_slider.configure(to=last, number_of_steps=last)
+        self.scrub_slider.set(0)
+        self.scrub_frame.grid()
+        self.pending_load = None
+        self.load_ms = None
+        self.video_worker.submit((self.video, 0))
+
+    def _on_scrub(self, value):
+        # Latest-wins worker: dragging only ever decodes the most recent position
+        if self.video is not None:
+            self.video_worker.submit((self.video, int(float(value))))
+
+    def _read_frame(self, job):
+        # Runs on the scrub worker, the only thread that reads sources, so none is in use here
+        while self.retired_videos:
+            self.retired_videos.popleft().close()
+        source, index = job
+        if source is None:
+            return None
+        frame = source.frame(index)
+        return (index, frame) if frame is not None else None
+
+    def _show_frame(self, job, result):
+        if job[0] is not self.video:
+            return  # a frame of a video that has since been replaced
+        index, frame = result
+        self.input_image = frame
+        self._set_source(frame, 1.0)
+        self.frame_label.configure(text=f"{index + 1} / {self.video.count}")
+
+    def _set_source(self, image, scale, proxy=None, proxy_scale=1.0):
+        # `image` is the input at `scale` of its full resolution. A precomputed canvas
+        # proxy (e.g. from the session cache) skips the resize.
+        if proxy is None:
+            proxy, proxy_scale = make_proxy(image, CANVAS_W, CANVAS_H)
+        self.proxy_image = proxy
+        self.proxy_scale = scale * proxy_scale
+        self.full_pixels = round(image.shape[0] * image.shape[1] / scale ** 2)
+        thumb, thumb_scale = make_proxy(self.proxy_image, THUMB_W, THUMB_H)
+        self.thumb_image, self.thumb_scale = thumb, self.proxy_scale * thumb_scale
+        self.image_gen += 1
+        self.pipeline.stage_cache.clear()
+        self.zoom = None
+        self.tile_cache.clear()
+        self.view_pool.clear()
+        # The canvas-sized proxy is the input preview, no second resize of the full image
+        self.display_image(cv2.cvtColor(self.proxy_image, cv2.COLOR_BGR2RGB), self.input_canvas)
+        self.apply_filter()
+        self._schedule_gallery(0)
+
+    def _finish_load(self):
+        # Blocks until the background decode is done, then replaces the preview
+        future, start = self.pending_load
+        self.pending_load = None
+        try:
+            image = future.result()
+        except Exception as e:
+            image = None
+            self.status_message = f"Full decode failed ({e}), editing the reduced preview only"
+        else:
+            if image is None:
+                # e.g. past OpenCV's pixel limit, which the reduced decode stays under
+                self.status_message = "Could not decode the full image, editing the reduced preview only"
+        if image is None:
+            return
+        self.input_image = image
+        self._set_source(self.input_image, 1.0)
+        self.load_ms = (self.load_ms[0], (time.perf_counter() - start) * 1000)
 
     def save_image(self):
-        if self.output_image is not None:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".png",
-                filetypes=[
-                    ("PNG files", "*.png"),
-                    ("JPEG files", "*.jpg"),
-                    ("TIFF files", "*.tiff"),
-                    ("All files", "*.*")
-                ]
+        if (self.input_image is None and self.pending_load is None) or self.export_future is not None:
+            return
+        filetypes = [
+            ("PNG files", "*.png"),
+            ("JPEG files", "*.jpg"),
+            ("TIFF files", "*.tiff"),
+            ("All files", "*.*")
+        ]
+        if self.video is not None:
+            filetypes = [("MP4 video", "*.mp4"), ("AVI video", "*.avi")] + filetypes
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".mp4" if self.video is not None else ".png",
+            filetypes=filetypes
+        )
+        if not file_path:
+            return
+        if self.video is not None and os.path.splitext(file_path)[1].lower() in VIDEO_EXTENSIONS:
+            self.export_progress = (0, max(1, self.video.count))
+            self.export_bar.set(0)
+            self.save_btn.configure(state="disabled")
+            self.export_future = self.export_runner.submit(
+                self._export_video_job, self.video_path, file_path, self._render_params()
             )
-            if file_path:
-                save_image = cv2.cvtColor(self.output_image, cv2.COLOR_RGB2BGR)
-                cv2.imwrite(file_path, save_image)
+            return
+        base = os.path.splitext(file_path)[0]
+        targets = [ExportTarget(file_path)]
+        if self.web_checkbox.get():
+            targets.append(ExportTarget(base + "_web.jpg", WEB_EXPORT_SIZE))
+        if self.thumb_checkbox.get():
+            targets.append(ExportTarget(base + "_thumb.jpg", THUMB_EXPORT_SIZE))
+        jpeg_slider, png_slider = self.export_sliders
+        options = {
+            "jpeg_quality": int(jpeg_slider.get()),
+            "png_compression": int(png_slider.get()),
+            "tiff_compression": self.tiff_menu.get(),
+        }
+        load = self.pending_load[0] if self.pending_load is not None else None
+        # Render is one step, then one per target
+        self.export_progress = (0, len(targets) + 1)
+        self.export_bar.set(0)
+        self.save_btn.configure(state="disabled")
+        self.export_future = self.export_runner.submit(
+            self._export_job, load, self.input_image, (self.image_gen, "full"), self._render_params(), targets, options
+        )
+
+    def _export_job(self, load, image, source_key, params, targets, options):
+        start = time.perf_counter()
+        if load is not None:
+            # Still decoding: wait here, off the Tk thread. The cache key would go stale
+            # when the full image swaps in, so render uncached.
+            image = load.result()
+            if image is None:
+                raise ValueError("could not decode the full image")
+            out = render_image(image, *params, use_lut=self.pipeline.use_lut,
+                               blur_tolerance=self.pipeline.blur_tolerance, lut3d=self.pipeline.lut3d)
+        else:
+            out = self.pipeline.render(image, source_key, *params)
+        render_s = time.perf_counter() - start
+        total = len(targets) + 1
+        self.export_progress = (1, total)
+
+        def progress(done, _):
+            self.export_progress = (done + 1, total)
+
+        results = export_image(out, targets, options, self.export_executor, progress)
+        encoders = ", ".join(
+            f"{os.path.basename(r['path'])} {r['encode_s'] * 1000:.0f} ms" for r in results
+        )
+        return f"Export: render {render_s * 1000:.0f} ms, {encoders}"
+
+    def _export_video_job(self, video_path, path, params):
+        # Own capture, the scrub worker keeps seeking the interactive one
+        source = open_source(video_path)
+        sink = open_sink(path, source.fps)
+        pipeline = RenderPipeline(stage_cache_bytes=0, use_lut=self.pipeline.use_lut, lut3d=self.pipeline.lut3d,
+                                  blur_tolerance=self.pipeline.blur_tolerance)
+
+        def progress(frames, seconds):
+            self.export_progress = (frames, max(frames, source.count))
+            self.status_message = f"Video: {frames}/{source.count} frames, {frames / seconds:.1f} fps"
+
+        try:
+            stats = process_video(source, sink, *params, pipeline=pipeline, progress=progress)
+        finally:
+            sink.close()
+            source.close()
+        return f"Video: {stats['frames']} frames in {stats['seconds']:.1f} s, {stats['fps']:.1f} fps"
+
+    def _finish_export(self):
+        future, self.export_future = self.export_future, None
+        self.save_btn.configure(state="normal")
+        try:
+            self.status_message = future.result()
+        except Exception as e:
+            traceback.print_exc()
+            self.status_message = f"Export failed: {e}"
+            return
+        self.export_bar.set(1)
 
     def apply_filter(self, *args):
+        # Interactive path: queue a proxy render, full resolution is deferred to save/render_full
+        if self.proxy_image is None:
+            return
+        self.output_image = None
+        if self.zoom is not None:
+            self._request_view()
+            return
+        source_key = (self.image_gen, "proxy")
+        params = self._render_params()
+        # The proxy takes the full image's LUT path, so with the 3D LUT on it previews the saved file
+        fused = self.pipeline.uses_lut(self.proxy_image, params[0], params[3], self.full_pixels)
+        self.render_worker.submit((self.proxy_image, source_key, self.proxy_scale, fused) + params)
+        self._update_stats()
+
+    def render_full(self):
+        if self.pending_load is not None:
+            self._finish_load()
         if self.input_image is None:
             return
-        filter_type = self.selected_filter
-        image_rgb = cv2.cvtColor(self.input_image, cv2.COLOR_BGR2RGB)
-        intensity = self.strength / 20.0  # -1.0 to +1.0
-        func = FILTER_FUNCTIONS.get(filter_type)
-        out = func(self, image_rgb, intensity) if func else image_rgb
-        # Apply contrast and exposure
-        if self.contrast != 1.0:
-            out = cv2.convertScaleAbs(out, alpha=self.contrast, beta=0)
-        if self.exposure != 1.0:
-            lab = cv2.cvtColor(out, cv2.COLOR_RGB2LAB)
-            l, a, b = cv2.split(lab)
-            l = cv2.convertScaleAbs(l, alpha=self.exposure)
-            lab = cv2.merge((l, a, b))
-            out = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-        self.output_image = out
+        if self.zoom is not None:
+            self._reset_view(render=False)
+        source_key = (self.image_gen, "full")
+        self.output_image = self.pipeline.render(self.input_image, source_key, *self._render_params())
         self.display_image(self.output_image, self.output_canvas)
 
-    def _modern_sepia(self, image, intensity):
-        # Warm sepia, negative reverses to cool
-        kernel = np.array([[0.393, 0.769, 0.189],
-                           [0.349, 0.686, 0.168],
-                           [0.272, 0.534, 0.131]])
-        sepia = cv2.transform(image, kernel)
-        sepia = cv2.convertScaleAbs(sepia)
-        if intensity >= 0:
-            out = cv2.addWeighted(image, 1-abs(intensity), sepia, abs(intensity), 0)
-        else:
-            # Reverse: cool blue tone
-            blue = image.copy()
-            blue[...,0] = np.clip(blue[...,0]+60*abs(intensity), 0, 255)
-            out = cv2.addWeighted(image, 1-abs(intensity), blue, abs(intensity), 0)
-        return np.clip(out, 0, 255).astype(np.uint8)
-
-    def _cinematic(self, image, intensity):
-        # Teal & orange, with contrast
-        if intensity == 0:
-            return image
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] = np.clip(img[...,0] + 30*intensity, 0, 255)  # Blue
-            img[...,2] = np.clip(img[...,2] + 30*intensity, 0, 255)  # Red
-        else:
-            img[...,1] = np.clip(img[...,1] + 30*(-intensity), 0, 255)  # Green
-        img = cv2.convertScaleAbs(img, alpha=1+0.2*abs(intensity), beta=0)
-        return img
-
-    def _teal_orange(self, image, intensity):
-        # Blockbuster look
-        if intensity == 0:
-            return image
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] = np.clip(img[...,0] + 40*intensity, 0, 255)
-            img[...,2] = np.clip(img[...,2] + 40*intensity, 0, 255)
-        else:
-            img[...,1] = np.clip(img[...,1] + 40*(-intensity), 0, 255)
-        img = cv2.convertScaleAbs(img, alpha=1+0.15*abs(intensity), beta=0)
-        return img
-
-    def _soft_pastel(self, image, intensity):
-        # Pastel: brighten, reduce contrast, add blur
-        if intensity == 0:
-            return image
-        img = cv2.convertScaleAbs(image, alpha=1-0.3*abs(intensity), beta=30*abs(intensity))
-        if intensity > 0:
-            img = cv2.GaussianBlur(img, (0,0), sigmaX=2*intensity)
-        else:
-            img = cv2.medianBlur(img, 3)
-        return img
-
-    def _deep_blue(self, image, intensity):
-        # Deep blue/cool
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] = np.clip(img[...,0] + 60*intensity, 0, 255)
-        else:
-            img[...,2] = np.clip(img[...,2] + 60*(-intensity), 0, 255)
-        return img.astype(np.uint8)
-
-    def _retro_fade(self, image, intensity):
-        # Faded retro: lower contrast, add magenta/green
-        img = cv2.convertScaleAbs(image, alpha=1-0.4*abs(intensity), beta=20*abs(intensity))
-        if intensity > 0:
-            img[...,0] = np.clip(img[...,0] + 20*intensity, 0, 255)
-            img[...,2] = np.clip(img[...,2] + 20*intensity, 0, 255)
-        else:
-            img[...,1] = np.clip(img[...,1] + 30*(-intensity), 0, 255)
-        return img
-
-    def _vibrant_pop(self, image, intensity):
-        # High vibrance
-        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(np.float32)
-        if intensity > 0:
-            hsv[...,1] = np.clip(hsv[...,1]*(1+0.8*intensity), 0, 255)
-        else:
-            hsv[...,1] = np.clip(hsv[...,1]*(1-0.8*(-intensity)), 0, 255)
-        img = cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2RGB)
-        return img
-
-    def _black_white(self, image, intensity):
-        # B&W, with fade or contrast
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        if intensity == 0:
-            return cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
-        if intensity > 0:
-            img = cv2.convertScaleAbs(gray, alpha=1+0.8*intensity, beta=0)
-        else:
-            img = cv2.convertScaleAbs(gray, alpha=1-0.8*(-intensity), beta=30*(-intensity))
-        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
-
-    def _dream_glow(self, image, intensity):
-        # Soft dreamy glow
-        if intensity == 0:
-            return image
-        blur = cv2.GaussianBlur(image, (0,0), sigmaX=2+8*abs(intensity))
-        if intensity > 0:
-            out = cv2.addWeighted(image, 1-0.5*intensity, blur, 0.5*intensity, 0)
-        else:
-            out = cv2.addWeighted(image, 1+0.5*intensity, blur, -0.5*intensity, 0)
-        return np.clip(out, 0, 255).astype(np.uint8)
-
-    def _clean_sharpen(self, image, intensity):
-        # Sharpen or soften
-        if intensity == 0:
-            return image
-        if intensity > 0:
-            kernel = np.array([[0, -1, 0], [-1, 5+2*intensity, -1], [0, -1, 0]])
-            out = cv2.filter2D(image, -1, kernel)
-        else:
-            out = cv2.GaussianBlur(image, (0,0), sigmaX=2*(-intensity))
-        return np.clip(out, 0, 255).astype(np.uint8)
-
-    def _matte_film(self, image, intensity):
-        # Matte: flatten contrast, slight fade
-        img = cv2.convertScaleAbs(image, alpha=1-0.3*abs(intensity), beta=15*abs(intensity))
-        lut = np.array([min(255, int(255*(i/255)**(1/(1+0.7*abs(intensity))))) for i in range(256)], dtype=np.uint8)
-        img = cv2.LUT(img, lut)
-        return img
-
-    def _golden_hour(self, image, intensity):
-        # Warm golden tint
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] -= 30*intensity
-            img[...,1] += 20*intensity
-            img[...,2] += 40*intensity
-        else:
-            img[...,0] += 20*(-intensity)
-            img[...,2] -= 20*(-intensity)
-        return np.clip(img, 0, 255).astype(np.uint8)
-
-    def _cyberpunk(self, image, intensity):
-        # Magenta/cyan pop
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] += 40*intensity
-            img[...,2] += 60*intensity
-        else:
-            img[...,1] += 40*(-intensity)
-            img[...,2] -= 40*(-intensity)
-        img = np.clip(img, 0, 255)
-        return img.astype(np.uint8)
-
-    def _sunset(self, image, intensity):
-        # Orange/pink sunset
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] += 20*intensity
-            img[...,1] += 10*intensity
-            img[...,2] += 40*intensity
-        else:
-            img[...,0] -= 20*(-intensity)
-            img[...,2] -= 20*(-intensity)
-        return np.clip(img, 0, 255).astype(np.uint8)
-
-    def _frosted(self, image, intensity):
-        # Cool, frosted look
-        img = image.astype(np.float32)
-        if intensity > 0:
-            img[...,0] += 40*intensity
-            img[...,1] += 20*intensity
-            img = cv2.GaussianBlur(img, (0,0), sigmaX=2*intensity)
-        else:
-            img[...,2] += 40*(-intensity)
-            img[...,1] -= 20*(-intensity)
-        return np.clip(img, 0, 255).astype(np.uint8)
-
-    def _noir(self, image, intensity):
-        # High-contrast B&W
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        if intensity == 0:
-            img = gray
-        elif intensity > 0:
-            img = cv2.convertScaleAbs(gray, alpha=1+2*intensity, beta=-40*intensity)
-        else:
-            img = cv2.convertScaleAbs(gray, alpha=1-1.5*(-intensity), beta=40*(-intensity))
-        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    def _render_params(self):
+        intensity = self.strength / 20.0  # -1.0 to +1.0
+        return (self.selected_filter, intensity, self.contrast, self.exposure)
+
+    def _render_job(self, job):
+        image, source_key, scale, fused, *params = job
+        keys = self.pipeline.stage_keys(image, source_key, *params, fused)
+
+        def resize():
+            rendered = self.pipeline.render(image, source_key, *params, scale, fused)
+            with self.profiler.span("resize"):
+                return fit_to_box(rendered, CANVAS_W, CANVAS_H)
+
+        with self.profiler.span("render_total"):
+            return self.pipeline.stage(("display", keys[-1]), resize)
+
+    def _schedule_gallery(self, delay=GALLERY_SETTLE_MS):
+        # Debounced: dragging a slider keeps pushing the refresh back until it settles
+        if self.thumb_image is None:
+            return
+        if self.gallery_after is not None:
+            self.root.after_cancel(self.gallery_after)
+        self.gallery_after = self.root.after(delay, self._refresh_gallery)
+
+    def _refresh_gallery(self):
+        self.gallery_after = None
+        _, intensity, contrast, exposure = self._render_params()
+        self.gallery_worker.submit((self.thumb_image, self.thumb_scale, intensity, contrast, exposure))
+
+    def _render_gallery(self, job):
+        image, scale, intensity, contrast, exposure = job
+        start = time.perf_counter()
+        with self.profiler.span("thumbnails"):
+            thumbnails = render_thumbnails(image, intensity, contrast, exposure, scale, self.gallery_executor)
+        return thumbnails, time.perf_counter() - start
+
+    def _show_gallery(self, result):
+        thumbnails, seconds = result
+        for name, thumb in thumbnails.items():
+            img = Image.fromarray(thumb)
+            self.filter_buttons[name].configure(
+                text=name, image=ctk.CTkImage(light_image=img, dark_image=img, size=img.size), compound="top"
+            )
+        self.gallery_ms = seconds * 1000
+
+    def _poll_render(self):
+        # A failing callback must not stop the loop, or previews, exports and stats all stall
+        try:
+            self._poll_results()
+        finally:
+            # Schedule against fixed deadlines so after() jitter does not accumulate
+            self.next_frame = max(self.next_frame + FRAME_S, time.perf_counter())
+            delay = int((self.next_frame - time.perf_counter()) * 1000)
+            self.root.after(max(1, delay), self._poll_render)
+
+    def _poll_results(self):
+        result = self.render_worker.take_result()
+        if result is not None and self.zoom is None:
+            self.display_image(result[1], self.output_canvas)
+        result = self.gallery_worker.take_result()
+        if result is not None:
+            self._show_gallery(result[1])
+        result = self.video_worker.take_result()
+        if result is not None:
+            self._show_frame(*result)
+        result = self.view_worker.take_result()
+        if result is not None and self.zoom is not None and result[0][0] == self.image_gen:
+            before, after = result[1]
+            self.views[self.input_canvas].show(before)
+            self.views[self.output_canvas].show(after)
+        if self.pending_load is not None and self.pending_load[0].done():
+            self._finish_load()
+        if self.export_future is not None:
+            done, total = self.export_progress
+            self.export_bar.set(done / total)
+            if self.export_future.done():
+                self._finish_export()
+        self._update_stats()
+        if self.profiler.enabled:
+            self._update_overlay()
+
+    def _update_stats(self):
+        worker = self.render_worker
+        text = f"Queue: {worker.queue_depth()}   Rendered: {worker.rendered}   Dropped: {worker.dropped}"
+        text += f"   FPS: {self.views[self.output_canvas].fps()}"
+        if self.zoom is not None:
+            text += f"   Zoom: {self.zoom * 100:.0f}% ({self.tile_cache.nbytes / 2**20:.0f} MB tiles)"
+        if self.pipeline.last_lut_error is not None:
+            text += f"   LUT max err: {self.pipeline.last_lut_error}"
+        if self.load_ms is not None:
+            first, full = self.load_ms
+            text += f"   Load: {first:.0f} ms" + (f" / full {full:.0f} ms" if full is not None else " / full ...")
+        if self.gallery_ms is not None:
+            text += f"   Thumbnails: {self.gallery_ms:.0f} ms"
+        if self.session is not None:
+            session = self.session
+            text += (f"\nFolder: {session.index + 1}/{len(session)} {session.name()}   "
+                     f"cache {session.cache.nbytes / 2**20:.0f} MB, {session.prefetched} prefetched")
+        if self.status_message is not None:
+            text += f"\n{self.status_message}"
+        if self.stats_label.cget("text") != text:
+            self.stats_label.configure(text=text)
+
+    def _bind_viewport(self, canvas):
+        # Wheel zooms about the cursor, drag pans, double-click fits; both canvases stay in sync
+        canvas.bind("<MouseWheel>", lambda e: self._zoom_at(e, 1 if e.delta > 0 else -1))
+        canvas.bind("<Button-4>", lambda e: self._zoom_at(e, 1))
+        canvas.bind("<Button-5>", lambda e: self._zoom_at(e, -1))
+        canvas.bind("<ButtonPress-1>", self._start_pan)
+        canvas.bind("<B1-Motion>", self._pan)
+        canvas.bind("<Double-Button-1>", lambda e: self._reset_view())
+
+    def _fit_zoom(self):
+        h, w = self.input_image.shape[:2]
+        return min(CANVAS_W / w, CANVAS_H / h)
+
+    def _view_box(self, zoom, cx, cy):
+        # Visible window in full-resolution pixels, with the centre clamped inside the image
+        h, w = self.input_image.shape[:2]
+        half_w, half_h = CANVAS_W / zoom / 2, CANVAS_H / zoom / 2
+        cx = w / 2 if 2 * half_w >= w else min(max(cx, half_w), w - half_w)
+        cy = h / 2 if 2 * half_h >= h else min(max(cy, half_h), h - half_h)
+        return max(0.0, cx - half_w), max(0.0, cy - half_h), min(w, cx + half_w), min(h, cy + half_h)
+
+    def _zoom_at(self, event, direction):
+        if self.input_image is None:
+            return
+        fit = self._fit_zoom()
+        zoom = self.zoom or fit
+        new_zoom = min(max(fit, MAX_ZOOM), max(fit, zoom * ZOOM_STEP ** direction))
+        if new_zoom <= fit * 1.001:
+            if self.zoom is not None:
+                self._reset_view()
+            return
+        h, w = self.input_image.shape[:2]
+        x0, y0, _, _ = self._view_box(zoom, *(self.view_center if self.zoom else (w / 2, h / 2)))
+        # Keep the image point under the cursor where it is
+        px, py = x0 + event.x / zoom, y0 + event.y / zoom
+        x0, y0 = px - event.x / new_zoom, py - event.y / new_zoom
+        x0, y0, x1, y1 = self._view_box(new_zoom, x0 + CANVAS_W / new_zoom / 2, y0 + CANVAS_H / new_zoom / 2)
+        self.zoom = new_zoom
+        self.view_center = ((x0 + x1) / 2, (y0 + y1) / 2)
+        self._request_view()
+
+    def _start_pan(self, event):
+        if self.zoom is not None:
+            self.pan_start = (event.x, event.y, self.view_center)
+
+    def _pan(self, event):
+        if self.zoom is None or self.pan_start is None:
+            return
+        x, y, (cx, cy) = self.pan_start
+        x0, y0, x1, y1 = self._view_box(self.zoom, cx - (event.x - x) / self.zoom, cy - (event.y - y) / self.zoom)
+        self.view_center = ((x0 + x1) / 2, (y0 + y1) / 2)
+        self._request_view()
+
+    def _reset_view(self, render=True):
+        if self.zoom is None or self.proxy_image is None:
+            return
+        self.zoom = None
+        self.display_image(cv2.cvtColor(self.proxy_image, cv2.COLOR_BGR2RGB), self.input_canvas)
+        if render:
+            self.apply_filter()
+
+    def _request_view(self):
+        if self.zoom is None or self.input_image is None:
+            return
+        self.view_worker.submit(
+            (self.image_gen, self.input_image, self._render_params(), self.zoom, self._view_box(self.zoom, *self.view_center))
+        )
+
+    def _view_level(self, gen, image, zoom):
+        # Pyramid of INTER_AREA halvings, built lazily per source. Picks the coarsest level
+        # that still has at least one pixel per display pixel.
+        if self.view_levels[0] != gen:
+            self.view_levels = (gen, [(1.0, image)])
+        levels = self.view_levels[1]
+        while levels[-1][0] / 2 >= zoom and min(levels[-1][1].shape[:2]) > 1:
+            prev = levels[-1][1]
+            level = cv2.resize(prev, (max(1, prev.shape[1] // 2), max(1, prev.shape[0] // 2)), interpolation=cv2.INTER_AREA)
+            levels.append((level.shape[1] / image.shape[1], level))
+        return next((s, level) for s, level in reversed(levels) if s >= zoom or s == 1.0)
+
+    def _render_view(self, job):
+        gen, image, params, zoom, (x0, y0, x1, y1) = job
+        scale, level = self._view_level(gen, image, zoom)
+        lh, lw = level.shape[:2]
+        lx0, ly0 = int(x0 * scale), int(y0 * scale)
+        lx1, ly1 = min(lw, math.ceil(x1 * scale)), min(lh, math.ceil(y1 * scale))
+        filter_type, intensity, contrast, exposure = params
+        halo = filter_halo(filter_type, intensity, scale)
+        fused = self.view_pipeline.uses_lut(level, filter_type, exposure, image.shape[0] * image.shape[1])
+        after = np.empty((ly1 - ly0, lx1 - lx0, 3), dtype=np.uint8)
+        # Only tiles touching the window are rendered; cached ones are reused while panning
+        for ty in range(ly0 // VIEW_TILE, (ly1 - 1) // VIEW_TILE + 1):
+            for tx in range(lx0 // VIEW_TILE, (lx1 - 1) // VIEW_TILE + 1):
+                bx0, by0 = tx * VIEW_TILE, ty * VIEW_TILE
+                key = (gen, scale, params, fused, tx, ty)
+                tile = self.tile_cache.get(key)
+                if tile is None:
+                    box = (bx0, by0, min(lw, bx0 + VIEW_TILE), min(lh, by0 + VIEW_TILE))
+                    tile = render_box(level, box, *params, halo, self.view_pool, scale,
+                                      self.view_pipeline if fused else None).copy()
+                    self.tile_cache.put(key, tile)
+                ix0, iy0 = max(lx0, bx0), max(ly0, by0)
+                ix1, iy1 = min(lx1, bx0 + tile.shape[1]), min(ly1, by0 + tile.shape[0])
+                after[iy0 - ly0:iy1 - ly0, ix0 - lx0:ix1 - lx0] = tile[iy0 - by0:iy1 - by0, ix0 - bx0:ix1 - bx0]
+        before = cv2.cvtColor(level[ly0:ly1, lx0:lx1], cv2.COLOR_BGR2RGB)
+        size = (min(CANVAS_W, max(1, round((lx1 - lx0) * zoom / scale))), min(CANVAS_H, max(1, round((ly1 - ly0) * zoom / scale))))
+        # Nearest neighbour past 100% so individual pixels stay crisp
+        interpolation = cv2.INTER_NEAREST if zoom > scale else cv2.INTER_AREA
+        return cv2.resize(before, size, interpolation=interpolation), cv2.resize(after, size, interpolation=interpolation)
+
+    def _update_overlay(self):
+        lines = [f"{'stage':<13}{'last':>7}{'p50':>7}{'p95':>7}  ms"]
+        for name, (last, p50, p95) in self.profiler.stats().items():
+            lines.append(f"{name:<13}{last:7.1f}{p50:7.1f}{p95:7.1f}")
+        self.views[self.output_canvas].set_overlay("\n".join(lines))
 
     def display_image(self, image, canvas):
         if image is None:
             return
-        h, w = image.shape[:2]
-        canvas_w, canvas_h = CANVAS_W, CANVAS_H
-        image_aspect = w / h
-        canvas_aspect = canvas_w / canvas_h
-        if image_aspect > canvas_aspect:
-            new_w = canvas_w
-            new_h = int(canvas_w / image_aspect)
-        else:
-            new_h = canvas_h
-            new_w = int(canvas_h * image_aspect)
-        resized = cv2.resize(image, (new_w, new_h))
-        img = Image.fromarray(resized)
-        imgtk = ImageTk.PhotoImage(image=img)
-        canvas.delete("all")
-        canvas.config(width=new_w, height=new_h)
-        canvas.create_image(new_w/2, new_h/2, image=imgtk)
-        canvas.image = imgtk
+        with self.profiler.span("display_resize"):
+            resized = fit_to_box(image, CANVAS_W, CANVAS_H)
+        with self.profiler.span("tk_upload"):
+            self.views[canvas].show(resized)
 
 if __name__ == "__main__":
     root = ctk.CTk()
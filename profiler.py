@@ -0,0 +1,102 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Lightweight stage profiler: named spans with rolling per-stage statistics, exportable as
+# Chrome trace-event JSON (open in Perfetto or chrome://tracing). While disabled a span
+# is one attribute check returning a shared no-op context manager.
+
+PROFILE_HISTORY = 120
+MAX_TRACE_EVENTS = 200000
+
+def percentile(samples, q):
+    # Nearest-rank percentile, stable for the small sample counts used here
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class _Span:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+class Profiler:
+    def __init__(self, history=PROFILE_HISTORY, max_events=MAX_TRACE_EVENTS):
+        self.enabled = False
+        self.history = history
+        self.samples = {}
+        # (name, start, duration, thread id), oldest dropped first
+        self.events = deque(maxlen=max_events)
+        self.threads = {}
+        self.epoch = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        thread = threading.current_thread()
+        with self._lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.history)
+            samples.append(end - start)
+            self.events.append((name, start, end - start, thread.ident))
+            self.threads[thread.ident] = thread.name
+
+    def stats(self):
+        # {stage: (last, p50, p95)} in milliseconds over the rolling window
+        with self._lock:
+            items = [(name, list(samples)) for name, samples in self.samples.items()]
+        return {
+            name: (samples[-1] * 1000, percentile(samples, 50) * 1000, percentile(samples, 95) * 1000)
+            for name, samples in items
+        }
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+            self.events.clear()
+            self.threads.clear()
+
+    def trace_events(self):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        trace = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        trace.extend(
+            {"name": name, "cat": "render", "ph": "X", "pid": pid, "tid": tid,
+             "ts": (start - self.epoch) * 1e6, "dur": duration * 1e6}
+            for name, start, duration, tid in events
+        )
+        return trace
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        return len(self.events)
@@ -0,0 +1,384 @@
+import argparse
+import base64
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import urllib.request
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import resource_tracker, shared_memory
+import cv2
+import numpy as np
+from engine import FILTERS, FILTER_FUNCTIONS, RenderPipeline
+from export import TIFF_COMPRESSION, encode_params
+from profiler import percentile
+
+# Local render service: the filter engine over HTTP + JSON, for tools outside the GUI.
+#   python server.py --port 8765 -j 4
+#   POST /render   {"filter": "Cinematic", "intensity": 0.5, "contrast": 1.0, "exposure": 1.0,
+#                   plus one image source:
+#                     "path": "in.jpg"              -> "output_path": "out.png" or encoded "data"
+#                     "data": "<base64 file bytes>" -> base64 "data" in "format" (default .png)
+#                     "shm": {"name": ..., "shape": [h, w, 3]}  BGR uint8 shared memory, zero copy;
+#                       the result is written back in place, or into "output_shm" of the same shape}
+#   GET  /metrics  queue depth, batch sizes, latency percentiles
+#   GET  /filters  filter names
+# /render only accepts application/json without an Origin header, so browsers cannot call it.
+# Requests arriving within --batch-window-ms of each other are batched: requests with the
+# same settings share one group, so a compiled colour LUT is reused across the group.
+
+DEFAULT_PORT = 8765
+BATCH_WINDOW_S = 0.002
+MAX_BATCH = 32
+LATENCY_HISTORY = 1000
+
+class _Request:
+    def __init__(self, params, load, finish, close=None):
+        self.params = params
+        self.load = load
+        self.finish = finish
+        self.close = close
+        self.future = Future()
+        self.received = time.perf_counter()
+
+class RenderService:
+    def __init__(self, workers=None, batch_window=BATCH_WINDOW_S, max_batch=MAX_BATCH, use_lut=True, lut3d=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        # Uncached stages, but compiled LUTs are shared by every worker thread
+        self.pipeline = RenderPipeline(stage_cache_bytes=0, use_lut=use_lut, lut3d=lut3d)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.requests = queue.Queue()
+        self.received = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.dispatched = 0
+        self.groups = 0
+        self.in_flight = 0
+        self.queue_s = deque(maxlen=LATENCY_HISTORY)
+        self.total_s = deque(maxlen=LATENCY_HISTORY)
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def warm_up(self):
+        # Run every filter once on every worker thread so first requests skip lazy init
+        image = np.full((64, 64, 3), 128, dtype=np.uint8)
+
+        def warm(_):
+            for name, _, _ in FILTERS:
+                self.pipeline.render(image, None, name, 0.5, 1.1, 1.1)
+            time.sleep(0.01)  # keep this thread busy so the next task lands on another
+
+        list(self.executor.map(warm, range(self.workers)))
+
+    def submit(self, params, load, finish, close=None):
+        # `close` runs after the request, whether it succeeded or not
+        request = _Request(params, load, finish, close)
+        with self._lock:
+            self.received += 1
+        self.requests.put(request)
+        return request.future
+
+    def _dispatch(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.params, []).append(request)
+            with self._lock:
+                self.batches += 1
+                self.dispatched += len(batch)
+                self.groups += len(groups)
+                self.in_flight += len(batch)
+            for params, requests in groups.items():
+                # Split large groups so one batch still uses every worker
+                chunks = min(len(requests), self.workers)
+                for i in range(chunks):
+                    self.executor.submit(self._run, params, requests[i::chunks])
+
+    def _run(self, params, requests):
+        for request in requests:
+            started = time.perf_counter()
+            image = None
+            try:
+                image = request.load()
+                out = self.pipeline.render(image, None, *params)
+                image = None  # may be a shared memory view that close() releases
+                request.future.set_result(request.finish(out, started - request.received))
+                ok = True
+            except Exception as e:
+                # The failed frames' locals may still view shared memory; drop them before close()
+                traceback.clear_frames(e.__traceback__)
+                image = None
+                request.future.set_exception(e)
+                ok = False
+            if request.close is not None:
+                request.close()
+            done = time.perf_counter()
+            with self._lock:
+                self.in_flight -= 1
+                if ok:
+                    self.completed += 1
+                    self.queue_s.append(started - request.received)
+                    self.total_s.append(done - request.received)
+                else:
+                    self.failed += 1
+
+    def metrics(self):
+        with self._lock:
+            queue_s = list(self.queue_s)
+            total_s = list(self.total_s)
+            metrics = {
+                "workers": self.workers,
+                "queue_depth": self.requests.qsize(),
+                "in_flight": self.in_flight,
+                "received": self.received,
+                "completed": self.completed,
+                "failed": self.failed,
+                "batches": self.batches,
+                "mean_batch_size": self.dispatched / self.batches if self.batches else 0.0,
+                "mean_groups_per_batch": self.groups / self.batches if self.batches else 0.0,
+            }
+        for name, samples in (("queue_ms", queue_s), ("latency_ms", total_s)):
+            metrics[name] = {
+                "p50": percentile(samples, 50) * 1000 if samples else None,
+                "p95": percentile(samples, 95) * 1000 if samples else None,
+            }
+        metrics["lut_cache_bytes"] = self.pipeline.lut_cache.nbytes
+        return metrics
+
+class BadRequest(ValueError):
+    pass
+
+def _open_shm(name):
+    # The segment belongs to the client: keep it out of this process's resource tracker,
+    # which would otherwise unlink it when the server exits
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _attach_shm(spec):
+    try:
+        shm = _open_shm(spec["name"])
+    except (KeyError, TypeError, ValueError, FileNotFoundError) as e:
+        raise BadRequest(f"bad shared memory handle: {e}")
+    try:
+        shape = tuple(int(n) for n in spec["shape"])
+    except (KeyError, TypeError, ValueError) as e:
+        shm.close()
+        raise BadRequest(f"bad shared memory shape: {e}")
+    if len(shape) != 3 or shape[2] != 3 or min(shape) < 1 or shm.size < shape[0] * shape[1] * 3:
+        shm.close()
+        raise BadRequest(f"shared memory {spec['name']} cannot hold an H x W x 3 image of shape {shape}")
+    return shm, shape
+
+def build_job(payload):
+    # Validates a /render payload and returns (params, load, finish, close) for RenderService.submit
+    if not isinstance(payload, dict):
+        raise BadRequest("the request body must be a JSON object")
+    filter_type = payload.get("filter")
+    if filter_type not in FILTER_FUNCTIONS:
+        raise BadRequest(f"unknown filter {filter_type!r}")
+    try:
+        params = (filter_type, float(payload.get("intensity", 0.5)),
+                  float(payload.get("contrast", 1.0)), float(payload.get("exposure", 1.0)))
+    except (TypeError, ValueError) as e:
+        raise BadRequest(str(e))
+    encoder = payload.get("encoder")
+    if encoder is not None and not isinstance(encoder, dict):
+        raise BadRequest("encoder must be a JSON object")
+    if encoder and encoder.get("tiff_compression", "lzw") not in TIFF_COMPRESSION:
+        raise BadRequest(f"tiff_compression must be one of {', '.join(TIFF_COMPRESSION)}")
+
+    def reply(out, queued, **extra):
+        return dict(extra, filter=filter_type, width=out.shape[1], height=out.shape[0],
+                    queue_ms=queued * 1000)
+
+    if "shm" in payload:
+        shm, shape = _attach_shm(payload["shm"])
+        out_spec = payload.get("output_shm")
+        try:
+            out_shm, out_shape = _attach_shm(out_spec) if out_spec else (shm, shape)
+        except BadRequest:
+            shm.close()
+            raise
+
+        def close():
+            for handle in {id(shm): shm, id(out_shm): out_shm}.values():
+                handle.close()
+
+        if out_shape != shape:
+            close()
+            raise BadRequest("output_shm must have the input's shape")
+
+        def load():
+            return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+        def finish(out, queued):
+            target = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf)
+            cv2.cvtColor(out, cv2.COLOR_RGB2BGR, dst=target)
+            del target
+            return reply(out, queued, output_shm=out_shm.name)
+
+        return params, load, finish, close
+
+    if "path" in payload:
+        path = payload["path"]
+        if not isinstance(path, str):
+            raise BadRequest("path must be a string")
+
+        def load():
+            image = cv2.imread(path)
+            if image is None:
+                raise BadRequest(f"could not decode {path}")
+            return image
+    elif "data" in payload:
+        try:
+            data = np.frombuffer(base64.b64decode(payload["data"]), dtype=np.uint8)
+        except (TypeError, ValueError) as e:
+            raise BadRequest(f"bad base64 data: {e}")
+        if not data.size:
+            raise BadRequest("image data is empty")
+
+        def load():
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if image is None:
+                raise BadRequest("could not decode image data")
+            return image
+    else:
+        raise BadRequest("one of path, data or shm is required")
+
+    output_path = payload.get("output_path")
+    if output_path is not None and not isinstance(output_path, str):
+        raise BadRequest("output_path must be a string")
+    ext = os.path.splitext(output_path)[1] if output_path else payload.get("format", ".png")
+    if not isinstance(ext, str) or not ext.startswith(".") or not cv2.haveImageWriter("x" + ext):
+        raise BadRequest(f"cannot write {ext!r} images; give an extension like .png")
+    try:
+        write_params = encode_params(ext, encoder)
+    except (TypeError, ValueError) as e:
+        raise BadRequest(f"bad encoder options: {e}")
+
+    def finish(out, queued):
+        bgr = cv2.cvtColor(out, cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode(ext, bgr, write_params)
+        if not ok:
+            raise BadRequest(f"could not encode {ext}")
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(encoded)
+            return reply(out, queued, output_path=output_path)
+        return reply(out, queued, format=ext, data=base64.b64encode(encoded).decode("ascii"))
+
+    return params, load, finish, None
+
+class RenderHandler(BaseHTTPRequestHandler):
+    service = None
+    timeout_s = 300
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, self.service.metrics())
+        elif self.path == "/filters":
+            self._send(200, {"filters": [name for name, _, _ in FILTERS]})
+        elif self.path == "/health":
+            self._send(200, {"ok": True})
+        else:
+            self._send(404, {"error": f"no route {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/render":
+            self._send(404, {"error": f"no route {self.path}"})
+            return
+        # Browsers may send a "simple" cross-origin POST (text/plain, no preflight) from any
+        # page, and binding to localhost does not stop it. Local tools send JSON and no Origin.
+        if self.headers.get("Origin") is not None:
+            self._send(403, {"error": "cross-origin requests are not allowed"})
+            return
+        if self.headers.get("Content-Type", "").split(";")[0].strip().lower() != "application/json":
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            result = self.service.submit(*build_job(payload)).result(self.timeout_s)
+        except (BadRequest, json.JSONDecodeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send(200, result)
+
+    def log_message(self, format, *args):
+        pass  # /metrics replaces per-request access logs
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, service=None):
+    handler = type("Handler", (RenderHandler,), {"service": service or RenderService()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def call(url, payload=None):
+    # Minimal client: GET when payload is None, otherwise POST it as JSON
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the filter engine over HTTP on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="render threads")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_S * 1000,
+                        help="how long the dispatcher waits to batch concurrent requests")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--exact", action="store_true", help="disable the fused colour LUTs")
+    parser.add_argument("--lut3d", action="store_true",
+                        help="render with exposure through an approximate 3D colour LUT (faster, a few levels off)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = RenderService(args.workers, args.batch_window_ms / 1000, args.max_batch, use_lut=not args.exact,
+                            lut3d=args.lut3d)
+    service.warm_up()
+    server = make_server(args.host, args.port, service)
+    print(f"Serving {len(FILTERS)} filters on http://{args.host}:{server.server_address[1]} "
+          f"with {service.workers} workers", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
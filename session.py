@@ -0,0 +1,99 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from batch import collect_inputs
+from engine import LRUCache, make_proxy
+
+# Folder session: ordered image files with a byte-bounded LRU of decoded images and
+# their preview proxies. Neighbours of the current image are decoded on background
+# threads, so stepping through a folder rarely waits on a decode.
+
+SESSION_CACHE_BYTES = 1024 * 1024 * 1024
+PREFETCH_RADIUS = 2
+
+class DecodedImage:
+    def __init__(self, path, image, proxy, proxy_scale):
+        self.path = path
+        self.image = image
+        self.proxy = proxy
+        self.proxy_scale = proxy_scale
+        self.nbytes = image.nbytes + (proxy.nbytes if proxy is not image else 0)
+
+class FolderSession:
+    def __init__(self, folder, proxy_w, proxy_h, cache_bytes=SESSION_CACHE_BYTES,
+                 prefetch_radius=PREFETCH_RADIUS, workers=2):
+        self.paths = collect_inputs([folder])
+        if not self.paths:
+            raise ValueError(f"no images in {folder}")
+        self.proxy_size = (proxy_w, proxy_h)
+        self.prefetch_radius = prefetch_radius
+        self.index = 0
+        self.cache = LRUCache(cache_bytes)
+        self.prefetched = 0
+        self._loading = {}
+        # Reentrant: a decode that finishes before add_done_callback runs its callback inline
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _decode(self, path):
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"could not decode {path}")
+        proxy, scale = make_proxy(image, *self.proxy_size)
+        entry = DecodedImage(path, image, proxy, scale)
+        self.cache.put(path, entry)
+        return entry
+
+    def _prefetch_done(self, path, future):
+        with self._lock:
+            if self._loading.get(path) is future:
+                del self._loading[path]
+
+    def get(self, index):
+        # Decoded image at `index`, becoming the current one. Cached and in-flight images
+        # return without a new decode; a miss is decoded right here, ahead of any prefetch.
+        self.index = index % len(self.paths)
+        path = self.paths[self.index]
+        entry = self.cache.get(path)
+        if entry is None:
+            with self._lock:
+                future = self._loading.get(path)
+            entry = future.result() if future is not None else self._decode(path)
+        self.prefetch()
+        return entry
+
+    def step(self, delta):
+        return self.get(self.index + delta)
+
+    def prefetch(self):
+        # Queue the neighbours nearest first, next before previous, and cancel queued
+        # decodes that have fallen out of the window
+        n = len(self.paths)
+        wanted = []
+        for distance in range(1, self.prefetch_radius + 1):
+            for index in (self.index + distance, self.index - distance):
+                path = self.paths[index % n]
+                if path not in wanted and path != self.paths[self.index]:
+                    wanted.append(path)
+        with self._lock:
+            for path, future in list(self._loading.items()):
+                # cancel() runs _prefetch_done inline, which may already have dropped it
+                if path not in wanted and future.cancel():
+                    self._loading.pop(path, None)
+            for path in wanted:
+                if path in self._loading or self.cache.get(path) is not None:
+                    continue
+                future = self._executor.submit(self._decode, path)
+                self._loading[path] = future
+                self.prefetched += 1
+                future.add_done_callback(lambda f, p=path: self._prefetch_done(p, f))
+
+    def name(self):
+        return os.path.basename(self.paths[self.index])
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,34 @@
+import threading
+import cv2
+import numpy as np
+from session import FolderSession
+
+def make_folder(tmp_path, count=12):
+    for i in range(count):
+        cv2.imwrite(str(tmp_path / f"img{i:02d}.png"), np.full((40, 60, 3), i * 20, dtype=np.uint8))
+    return str(tmp_path)
+
+def test_step_while_prefetches_are_queued(tmp_path):
+    # Regression: cancelling a queued prefetch runs its done-callback inline, which already
+    # drops it from _loading, so prefetch() must not delete it a second time
+    session = FolderSession(make_folder(tmp_path), 30, 20, workers=2, prefetch_radius=2)
+    release = threading.Event()
+    decode = session._decode
+
+    def slow_decode(path):
+        if path not in session.paths[:2]:
+            release.wait(10)
+        return decode(path)
+
+    session._decode = slow_decode
+    try:
+        session.get(0)
+        session._loading[session.paths[1]].result(10)
+        # paths[-1] holds one worker and paths[2] the other, so paths[-2] is still queued
+        assert not session._loading[session.paths[-2]].running()
+        entry = session.step(1)
+        assert entry.path == session.paths[1]
+        assert session.paths[-2] not in session._loading
+    finally:
+        release.set()
+        session.close()
@@ -0,0 +1,232 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from batch import collect_inputs
+from engine import FAST_BLUR_PSNR, FILTER_FUNCTIONS, BufferPool, RenderPipeline, render_into
+
+# Streaming video and frame-sequence filtering. A reader thread decodes frames into a
+# bounded queue, a thread pool renders them, and finished frames are written back in
+# order, so at most --max-frames decoded frames are alive however long the input is:
+#   python video.py clip.mp4 graded.mp4 --filter Cinematic --intensity 0.5 -j 4
+#   python video.py "frames/*.png" graded_frames/ --filter Noir
+
+VIDEO_EXTENSIONS = {".mp4", ".m4v", ".mov", ".avi", ".mkv"}
+FOURCC = {".mp4": "mp4v", ".m4v": "mp4v", ".mov": "mp4v", ".avi": "MJPG", ".mkv": "XVID"}
+DEFAULT_FPS = 30.0
+DEFAULT_MAX_FRAMES = 16
+
+class VideoSource:
+    def __init__(self, path):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"could not open {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        # Container metadata, may be an estimate
+        self.count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def read(self):
+        ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def frame(self, index):
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        return self.read()
+
+    def close(self):
+        self.capture.release()
+
+class SequenceSource:
+    # Sorted image files from a directory or glob, read as frames
+    def __init__(self, pattern, fps=DEFAULT_FPS):
+        self.paths = collect_inputs([pattern])
+        if not self.paths:
+            raise ValueError(f"no images match {pattern}")
+        self.fps = fps
+        self.count = len(self.paths)
+        self.position = 0
+
+    def read(self):
+        if self.position >= self.count:
+            return None
+        self.position += 1
+        frame = cv2.imread(self.paths[self.position - 1])
+        if frame is None:
+            raise ValueError(f"could not decode {self.paths[self.position - 1]}")
+        return frame
+
+    def frame(self, index):
+        self.position = index
+        return self.read()
+
+    def close(self):
+        pass
+
+def open_source(path):
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return VideoSource(path)
+    return SequenceSource(path)
+
+class VideoSink:
+    # The writer is opened on the first frame, once the frame size is known
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.writer = None
+
+    def write(self, frame):
+        if self.writer is None:
+            ext = os.path.splitext(self.path)[1].lower()
+            fourcc = cv2.VideoWriter_fourcc(*FOURCC.get(ext, "mp4v"))
+            self.writer = cv2.VideoWriter(self.path, fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+            if not self.writer.isOpened():
+                raise ValueError(f"could not open {self.path} for writing")
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+class SequenceSink:
+    def __init__(self, directory, ext=".png"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ext = ext
+        self.index = 0
+
+    def write(self, frame):
+        path = os.path.join(self.directory, f"frame_{self.index:06d}{self.ext}")
+        if not cv2.imwrite(path, frame):
+            raise ValueError(f"could not encode {path}")
+        self.index += 1
+
+    def close(self):
+        pass
+
+def open_sink(path, fps, frame_ext=".png"):
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return VideoSink(path, fps)
+    return SequenceSink(path, frame_ext)
+
+def process_video(source, sink, filter_type, intensity, contrast=1.0, exposure=1.0,
+                  workers=None, max_frames=DEFAULT_MAX_FRAMES, pipeline=None, progress=None):
+    # Renders every frame of `source` into `sink` in order. At most `max_frames` decoded
+    # frames exist at once: queued for rendering, in flight, or held by the reader.
+    # `progress(frames_written, seconds)` is called after each frame. Returns run statistics.
+    # The pipeline's settings (use_lut, lut3d, blur_tolerance) apply to every frame.
+    if max_frames < 3:
+        raise ValueError("max_frames must be at least 3")
+    workers = workers or os.cpu_count() or 1
+    in_flight = max(1, min(2 * workers, max_frames - 2))
+    frames = queue.Queue(maxsize=max(1, max_frames - in_flight - 1))
+    pipeline = pipeline or RenderPipeline(stage_cache_bytes=0)
+    stop = threading.Event()
+    local = threading.local()
+    fused = None
+
+    def read():
+        try:
+            while not stop.is_set():
+                frame = source.read()
+                if frame is None:
+                    break
+                frames.put(frame)
+        except Exception as e:
+            frames.put(e)
+        finally:
+            frames.put(None)
+
+    def render(frame):
+        if fused:
+            # No source key: frames are rendered uncached, even through a caching pipeline
+            out = pipeline.render(frame, None, filter_type, intensity, contrast, exposure, fused=True)
+        else:
+            if not hasattr(local, "pool"):
+                local.pool = BufferPool()
+            out = render_into(frame, filter_type, intensity, contrast, exposure, local.pool,
+                              tolerance=pipeline.blur_tolerance)
+        # A fresh BGR copy, the pooled result is reused by this thread's next frame
+        return cv2.cvtColor(out, cv2.COLOR_RGB2BGR)
+
+    pending = deque()
+    written = 0
+    start = time.perf_counter()
+
+    def drain(limit):
+        nonlocal written
+        while len(pending) > limit:
+            sink.write(pending.popleft().result())
+            written += 1
+            if progress:
+                progress(written, time.perf_counter() - start)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                if fused is None:
+                    # Same path for every frame, so the whole clip matches
+                    fused = pipeline.uses_lut(frame, filter_type, exposure)
+                pending.append(executor.submit(render, frame))
+                drain(in_flight - 1)
+            drain(0)
+    finally:
+        stop.set()
+        # Unblock a reader waiting on a full queue so it can see the stop flag
+        while reader.is_alive():
+            try:
+                frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+    seconds = time.perf_counter() - start
+    return {"frames": written, "seconds": seconds, "fps": written / seconds if seconds > 0 else 0.0}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Filter a video or an image sequence frame by frame")
+    parser.add_argument("input", help="video file, or a directory or glob of frames")
+    parser.add_argument("output", help="video file (.mp4, .avi, ...) or a directory for frames")
+    parser.add_argument("--filter", required=True, choices=sorted(FILTER_FUNCTIONS), help="filter name")
+    parser.add_argument("--intensity", type=float, default=0.5, help="effect intensity, -1.0 to 1.0")
+    parser.add_argument("--contrast", type=float, default=1.0)
+    parser.add_argument("--exposure", type=float, default=1.0)
+    parser.add_argument("--fps", type=float, help="output frame rate (default: the input's, 30 for sequences)")
+    parser.add_argument("--frame-ext", default=".png", help="image format when writing frames to a directory")
+    parser.add_argument("--max-frames", type=int, default=DEFAULT_MAX_FRAMES, help="decoded frames kept in memory")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="render threads")
+    parser.add_argument("--fast-blur", type=float, nargs="?", const=FAST_BLUR_PSNR, metavar="PSNR",
+                        help=f"approximate large blurs on a downsampled pyramid level, within PSNR dB "
+                             f"of the exact blur (default {FAST_BLUR_PSNR:.0f})")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    source = open_source(args.input)
+    sink = open_sink(args.output, args.fps or source.fps, args.frame_ext)
+
+    def progress(frames, seconds):
+        if frames % 10 == 0 or frames == source.count:
+            print(f"\r{frames}/{source.count} frames, {frames / seconds:.1f} fps", end="", file=sys.stderr, flush=True)
+
+    try:
+        stats = process_video(source, sink, args.filter, args.intensity, args.contrast, args.exposure,
+                              workers=args.workers, max_frames=args.max_frames, progress=progress,
+                              pipeline=RenderPipeline(stage_cache_bytes=0, blur_tolerance=args.fast_blur))
+    finally:
+        sink.close()
+        source.close()
+    print(f"\n{stats['frames']} frames in {stats['seconds']:.2f} s: {stats['fps']:.1f} fps", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())